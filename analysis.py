@@ -1,14 +1,16 @@
 """This module are functions to analyze data for plots or tables."""
 from getdata import *
+from sketch import merge_sketches, SKETCH_ALPHA
 
 AGG_DICT = {'Sum': 'sum', 'Num': 'count', 'Std': 'std', 'Avg': 'mean', 'Min': 'min', 'Max': 'max', 'Median': 'median'}
 
 
-def sleep_compare(base_day=None, range_days=7):
+def sleep_compare(base_day=None, range_days=7, session=None):
     """
     Analyze summary of today's sleep data and compared with previous days'
     :param base_day: a date string for comparison
     :param range_days: time range of previous days
+    :param session: ReportSession covering the previous days to take entries from, default query database.
     """
     if base_day is not None:
         end = str2datetime(base_day).replace(days=1).timestamp
@@ -18,7 +20,10 @@ def sleep_compare(base_day=None, range_days=7):
         start, end = human_qr(sentence)
     dataframe = pd.DataFrame(index=['Bed Time', 'Up Time', 'Length'],
                              columns=['Today', 'v.s Yesterday', 'In {0} days'.format(range_days)])
-    entries = get_sleep_data(start, end)
+    if session is not None:
+        entries = session.sleep_entries(start, end)
+    else:
+        entries = get_sleep_data(start, end)
     data = pd.DataFrame(entries, columns=['from', 'to', 'delta'])
 
     # If base day and the date of last entry is not the same day
@@ -43,8 +48,8 @@ def sleep_compare(base_day=None, range_days=7):
     dataframe.ix['Length', 'Today'], dataframe.ix['Length', 'v.s Yesterday'] = entry_str, delta_str
 
     len_rank = "#" + str(int(data.rank().delta.values[-1]))
-    bed_rank = "#" + str(int(data['from'].map(lambda x: ts_cross_day(x)).rank().values[-1]))
-    getup_rank = "#" + str(int(data['to'].map(lambda x: ts_cross_day(x)).rank().values[-1]))
+    bed_rank = "#" + str(int(cross_day_seconds(data['from']).rank().values[-1]))
+    getup_rank = "#" + str(int(cross_day_seconds(data['to']).rank().values[-1]))
     dataframe['In {0} days'.format(range_days)] = [bed_rank, getup_rank, len_rank]
     return dataframe
 
@@ -53,7 +58,7 @@ def get_pie_data(cut_data):
     """Provide percentage and average information of group and types for pie chart.
     :param cut_data: dataframe cut with start and end
     """
-    num_date = len(cut_data.to.map(ts2date).unique()) - 1
+    num_date = local_calendar(cut_data.to)['date'].nunique() - 1
     total_delta = cut_data.delta.sum()
     table = cut_data[['delta', 'group', 'type']].groupby(['group', 'type']).aggregate(np.sum)
     table_group = cut_data[['delta', 'group']].groupby(['group']).aggregate(np.sum)
@@ -72,13 +77,14 @@ def get_pie_data(cut_data):
     return table
 
 
-def get_type_detail(data):
+def get_type_detail(data, session=None):
     """
     Aggregate data for each type to calculate its percentage and other statistics for type detailed table.
     :param data: (dataframe) cut data
+    :param session: ReportSession to take types from, default query database.
     :return: (dataframe)
     """
-    types = get_all_types()
+    types = session.types.all_types() if session is not None else get_all_types()
     # Not using start, end in case of end have not happened yet
     days = len(get_datelist(data['from'].values[0], data.to.values[-1], 0))
     result = data.groupby(['group', 'type'])['delta'].agg(AGG_DICT)
@@ -118,7 +124,7 @@ def get_task_table(cut_data):
 
 # TODO use OOD to combine data and plot into same class
 
-def agg_level(start, end, cate, level, lst=None):
+def agg_level(start, end, cate, level, lst=None, session=None, rollup=False):
     """
     Aggregate and calculate descriptive statistics of data according to time frame.
     :param start: (int) unix timestamp.
@@ -126,9 +132,18 @@ def agg_level(start, end, cate, level, lst=None):
     :param cate: (str) 'group' or 'type'.
     :param level: (int) time frame number.
     :param lst: (list) a list of group or type names.
+    :param session: ReportSession of the same start and end to take entries from, default query database.
+    :param rollup: (bool) answer from daily rollup with agg_level_rollup(), start and end have to be local midnights.
+        Sum is exact, see agg_level_rollup() for the other statistics. Raw intervals are used instead
+        when database has no rollup yet.
     :return: (dataframe)
     """
-    data = get_cut_level_dataframe(start, end, level)
+    if rollup and (session.rollup() is not None if session is not None else data_step_done('rebuild_rollup')):
+        return agg_level_rollup(start, end, cate, level, lst, session)
+    if session is not None:
+        data = session.cut_level(level)
+    else:
+        data = get_cut_level_dataframe(start, end, level)
     if lst is None:
         if cate == 'type':
             lst = data.type.unique()
@@ -147,3 +162,70 @@ def agg_level(start, end, cate, level, lst=None):
     data = data[['date', cate, 'Num', 'Sum', 'Avg', 'Std', 'Median', 'Min', 'Max']]
     data.fillna(value=0, inplace=True)
     return data
+
+
+def agg_level_rollup(start, end, cate, level, lst=None, session=None):
+    """
+    Same table as agg_level(), answered from daily rollup instead of raw intervals,
+    so the cost grows with days and types, not with number of intervals.
+    Days are merged into periods with mergeable statistics (see sketch.py): Std is exact,
+    Median is within SKETCH_ALPHA relative error. Sum is exact at every level. Rollup counts the pieces
+    of intervals split at midnight, so the other statistics equal agg_level() at day level only.
+    :param start: (int) unix timestamp of a local midnight.
+    :param end: (int) unix timestamp of a local midnight.
+    :param cate: (str) 'group' or 'type'.
+    :param level: (int) time frame number.
+    :param lst: (list) a list of group or type names.
+    :param session: ReportSession of the same start and end to take rollup rows from, default query database.
+    :return: (dataframe)
+    """
+    data = session.rollup() if session is not None else get_rollup_dataframe(start, end)
+    if lst is None:
+        lst = data[cate].unique()
+    # days are labelled by the period they fall in, same as pieces of agg_level()
+    points = [start] + break_level(start, end, level)
+    date_ind = map(lambda x: ts2str_level(x, level), points)
+    period = np.searchsorted(np.asarray(points, dtype=np.int64), data['day_start'].values, side='right') - 1
+    data['date_agg'] = np.asarray(date_ind)[period] if data.shape[0] != 0 else []
+    keys = ['date_agg', cate]
+    grouped = data.groupby(keys)
+    result = pd.DataFrame({'Num': grouped['num'].sum(), 'Sum': grouped['seconds'].sum(),
+                           'Min': grouped['shortest'].min(), 'Max': grouped['longest'].max(),
+                           'Median': grouped['sketch'].agg(lambda x: merge_sketches(x).quantile(0.5))})
+    result['Avg'] = result['Sum'] * 1. / result['Num']
+    # merge m2 of days (Chan et al.): m2 = sum(m2_i + n_i * (mean_i - mean) ** 2)
+    mean = data[keys].merge(result[['Avg']], left_on=keys, right_index=True, how='left')['Avg'].values
+    spread = data['m2'] + data['num'] * (data['seconds'] * 1. / data['num'] - mean) ** 2
+    result['Std'] = np.sqrt(spread.groupby([data[x] for x in keys]).sum() / (result['Num'] - 1))
+    multi_ind = pd.MultiIndex.from_product([date_ind, lst])
+    data = result.reindex(multi_ind, columns=['Num', 'Sum', 'Avg', 'Std', 'Median', 'Min', 'Max'], fill_value=0)
+    data.index.names = ['date', cate]
+    data = data.reset_index()
+    data = data[['date', cate, 'Num', 'Sum', 'Avg', 'Std', 'Median', 'Min', 'Max']]
+    data.fillna(value=0, inplace=True)
+    return data
+
+
+def validate_rollup(start, end, cate, level, session=None):
+    """
+    Compare agg_level_rollup() against agg_level() on raw intervals.
+    Median may differ by SKETCH_ALPHA relative error, other statistics have to be equal.
+    :param start: (int) unix timestamp of a local midnight.
+    :param end: (int) unix timestamp of a local midnight.
+    :param cate: (str) 'group' or 'type'.
+    :param level: (int) time frame number.
+    :param session: ReportSession of the same start and end to take entries from, default query database.
+    :return: (dataframe) rows of date and cate where any comparable statistic differs, empty when all agree.
+    """
+    columns = ['Sum'] if level != 0 else ['Num', 'Sum', 'Avg', 'Std', 'Median', 'Min', 'Max']
+    raw = agg_level(start, end, cate, level, session=session)
+    rollup = agg_level_rollup(start, end, cate, level)
+    result = raw.merge(rollup, on=['date', cate], how='outer', suffixes=('', ' Rollup'))
+    result.fillna(value=0, inplace=True)
+    diff = np.zeros(result.shape[0], dtype=bool)
+    for column in columns:
+        tolerance = SKETCH_ALPHA if column == 'Median' else 1e-9
+        diff |= (np.abs(result[column] - result[column + ' Rollup']) > tolerance * result[column].abs() + 1e-6).values
+    result = result.ix[diff, ['date', cate] + columns + [x + ' Rollup' for x in columns]]
+    print "Rollup {0} {1} rows differ from raw intervals at level {2}.".format(result.shape[0], cate, level)
+    return result
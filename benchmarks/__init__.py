@@ -0,0 +1,38 @@
+"""Benchmarks of the report pipeline on synthetic data, run by asv, see asv.conf.json.
+Modules of the repository are imported from the working tree, databases are SQLite files built by synthetic.py.
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# before db is imported, its backend is chosen at import
+os.environ['TIME_DB_BACKEND'] = 'sqlite'
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+import db
+from synthetic import HISTORY_YEARS, build_synthetic_db
+
+# periods of the last weeks of synthetic history, report level: date string
+PERIODS = {0: '20151125', 1: '2015W48', 2: '2015M11'}
+
+
+def build_databases():
+    """
+    setup_cache of every benchmark reading the database. Classes share this function, as a staticmethod,
+    so asv builds the databases once per run, in its cache directory.
+    :return: (dict) years of history: SQLite file.
+    """
+    paths = {}
+    for years in HISTORY_YEARS:
+        paths[years] = os.path.abspath('time_{0}y.db'.format(years))
+        build_synthetic_db(years, paths[years])
+    return paths
+
+
+def use_database(path):
+    """
+    Read the synthetic database in path from now on.
+    :param path: (str) SQLite file from build_databases().
+    """
+    db.SQLITE_PATH = path
@@ -0,0 +1,83 @@
+"""Benchmarks of queries and analysis behind reports, on databases of every history length."""
+from benchmarks import HISTORY_YEARS, PERIODS, build_databases, use_database
+from analysis import agg_level, get_pie_data, get_type_detail, sleep_compare
+from getdata import ReportSession, get_cut_dataframe, get_cut_level_dataframe
+from synthetic import SYNTHETIC_END
+from time_func import str2level_range, str2ts
+
+
+class Period(object):
+    """Data of a weekly or monthly report, with trends of a week by day and of a month by week."""
+    params = (HISTORY_YEARS, [1, 2])
+    param_names = ['years', 'level']
+    setup_cache = staticmethod(build_databases)
+
+    def setup(self, paths, years, level):
+        use_database(paths[years])
+        self.start, self.end = str2level_range(PERIODS[level], level)
+
+    def time_get_cut_level_dataframe(self, paths, years, level):
+        get_cut_level_dataframe(self.start, self.end, level - 1)
+
+    def time_agg_level_group(self, paths, years, level):
+        agg_level(self.start, self.end, 'group', level - 1)
+
+    def time_agg_level_type(self, paths, years, level):
+        agg_level(self.start, self.end, 'type', level - 1)
+
+    def time_agg_level_type_rollup(self, paths, years, level):
+        agg_level(self.start, self.end, 'type', level - 1, rollup=True)
+
+
+class History(object):
+    """Monthly trends of the whole history, the query that grows with it."""
+    params = HISTORY_YEARS
+    param_names = ['years']
+    setup_cache = staticmethod(build_databases)
+    timeout = 300
+
+    def setup(self, paths, years):
+        use_database(paths[years])
+        self.start = str2ts(SYNTHETIC_END.replace(year=SYNTHETIC_END.year - years).strftime('%Y%m%d'))
+        self.end = str2ts(SYNTHETIC_END.strftime('%Y%m%d'))
+
+    def time_get_cut_level_dataframe(self, paths, years):
+        get_cut_level_dataframe(self.start, self.end, 2)
+
+    def time_agg_level_group(self, paths, years):
+        agg_level(self.start, self.end, 'group', 2)
+
+    def time_agg_level_group_rollup(self, paths, years):
+        agg_level(self.start, self.end, 'group', 2, rollup=True)
+
+
+class Sleep(object):
+    """Sleep table of a daily report, queried from the database."""
+    params = HISTORY_YEARS
+    param_names = ['years']
+    setup_cache = staticmethod(build_databases)
+
+    def setup(self, paths, years):
+        use_database(paths[years])
+
+    def time_sleep_compare(self, paths, years):
+        sleep_compare(PERIODS[0])
+
+
+class Analysis(object):
+    """Tables of a report from entries already in memory, which do not depend on the history length."""
+    params = [0, 1, 2]
+    param_names = ['level']
+    setup_cache = staticmethod(build_databases)
+
+    def setup(self, paths, level):
+        use_database(paths[min(HISTORY_YEARS)])
+        start, end = str2level_range(PERIODS[level], level)
+        self.session = ReportSession(start, end)
+        self.cut_data = get_cut_dataframe(start, end)
+
+    def time_get_type_detail(self, paths, level):
+        get_type_detail(self.cut_data, self.session)
+
+    def time_get_pie_data(self, paths, level):
+        get_pie_data(self.cut_data)
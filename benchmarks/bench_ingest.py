@@ -0,0 +1,35 @@
+"""Benchmarks of writing intervals into the database, rollup refresh included."""
+import os
+import shutil
+import tempfile
+from benchmarks import HISTORY_YEARS, use_database
+from db import create_all_tables, insert_intervals, insert_types
+from synthetic import synthetic_intervals, synthetic_types
+
+# intervals generated once per process, years: list
+_INTERVALS = {}
+
+
+class Ingest(object):
+    """Insert the whole history into an empty database, as `rebuild` does."""
+    params = HISTORY_YEARS
+    param_names = ['years']
+    # every sample needs an empty database from setup(), so one call per sample and no warmup calls
+    number = 1
+    repeat = 3
+    warmup_time = 0
+    timeout = 300
+
+    def setup(self, years):
+        if years not in _INTERVALS:
+            _INTERVALS[years] = list(synthetic_intervals(years))
+        self.folder = tempfile.mkdtemp()
+        use_database(os.path.join(self.folder, 'time.db'))
+        create_all_tables()
+        insert_types(synthetic_types())
+
+    def teardown(self, years):
+        shutil.rmtree(self.folder)
+
+    def time_insert_intervals(self, years):
+        insert_intervals(_INTERVALS[years])
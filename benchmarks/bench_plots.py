@@ -0,0 +1,74 @@
+"""Benchmarks of drawing and encoding each chart of plot_func, from prepared data."""
+from benchmarks import HISTORY_YEARS, PERIODS, build_databases, use_database
+from analysis import agg_level, get_task_table, get_type_detail, sleep_compare
+from getdata import ReportSession
+from plot_func import (agg_line_plot, group_barh_plot, group_pie_plot, sleep_plot, sleep_table_plot,
+                       task_table_plot, type_bar_grid_plot, type_table_plot)
+from time_func import str2level_range
+
+
+def report_session(paths, level):
+    """Return ReportSession of the benchmark period of a level, charts do not depend on the history length."""
+    use_database(paths[min(HISTORY_YEARS)])
+    start, end = str2level_range(PERIODS[level], level)
+    return ReportSession(start, end)
+
+
+class Charts(object):
+    """Charts of reports of every level."""
+    params = [0, 1, 2]
+    param_names = ['level']
+    setup_cache = staticmethod(build_databases)
+
+    def setup(self, paths, level):
+        self.session = report_session(paths, level)
+        self.cut_data = self.session.cut()
+        self.task_data = get_task_table(self.cut_data)
+        self.type_data = get_type_detail(self.cut_data, self.session)
+
+    def time_group_pie_plot(self, paths, level):
+        group_pie_plot(self.cut_data, self.session.types)
+
+    def time_task_table_plot(self, paths, level):
+        task_table_plot(self.task_data, self.session.types)
+
+    def time_type_table_plot(self, paths, level):
+        type_table_plot(self.type_data, self.session.types)
+
+
+class TrendCharts(object):
+    """Trend charts of weekly and monthly reports, a week by day and a month by week."""
+    params = [1, 2]
+    param_names = ['level']
+    setup_cache = staticmethod(build_databases)
+
+    def setup(self, paths, level):
+        session = report_session(paths, level)
+        self.types = session.types
+        self.agg_group = agg_level(session.start, session.end, 'group', level - 1, session=session)
+        self.agg_type = agg_level(session.start, session.end, 'type', level - 1, session=session)
+        self.sleep_data = session.sleep()
+
+    def time_group_barh_plot(self, paths, level):
+        group_barh_plot(self.agg_group, level - 1, self.types)
+
+    def time_type_bar_grid_plot(self, paths, level):
+        type_bar_grid_plot(self.agg_type, level - 1, self.types)
+
+    def time_agg_line_plot(self, paths, level):
+        agg_line_plot(self.agg_group, 'group', level - 1)
+
+    def time_sleep_plot(self, paths, level):
+        sleep_plot(self.sleep_data)
+
+
+class SleepTable(object):
+    """Sleep table of a daily report."""
+    setup_cache = staticmethod(build_databases)
+
+    def setup(self, paths):
+        use_database(paths[min(HISTORY_YEARS)])
+        self.sleep_data = sleep_compare(PERIODS[0])
+
+    def time_sleep_table_plot(self, paths):
+        sleep_table_plot(self.sleep_data)
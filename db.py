@@ -1,33 +1,271 @@
 """This module perform operations about database."""
-import mysql.connector
+import os
+import re
+import sqlite3
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import islice
+from sketch import Moments, QuantileSketch
+from time_calendar import calendar_between
+
+# rows sent in one executemany() and committed together
+BULK_CHUNK = 1000
+TYPE_COLUMNS = ['guid', 'group', 'name', 'parent', 'order', 'color', 'deleted', 'revision', 'imageId']
+INTERVAL_COLUMNS = ['guid', 'type', 'from', 'to', 'delta', 'comment', 'activityGuid']
+# one row per local day and type, see refresh_rollup()
+ROLLUP_COLUMNS = ['date', 'type', 'day_start', 'seconds', 'num', 'shortest', 'longest', 'm2', 'sketch']
+DB_CONFIG = {
+    'user': 'root',
+    'password': 'root',
+    'host': 'localhost',
+    'database': 'time',
+    'raise_on_warnings': True,
+}
+SQLITE_PATH = 'time.db'
+# counters of connections opened and reused by the whole process, db_session() counts its own
+POOL_STATS = {'opened': 0, 'reused': 0}
+_SESSION = {'depth': 0, 'idle': {}, 'stats': {}}
+# storage backend used by connect_db(), 'mysql' or 'sqlite', see use_backend()
+_BACKEND = {'name': os.environ.get('TIME_DB_BACKEND', 'mysql')}
+# bumped whenever `types` is written, so cached type metadata knows to check for changes
+TYPES_WRITTEN = {'count': 0}
+# (version, description, statements), applied in order by migrate_db().
+# Append new migrations at the end, never edit one that has been released.
+# A statement is SQL, or a data step ('data', name) filling tables from existing data with DATA_STEPS[name],
+# run once the schema is the latest, see migrate_data().
+MIGRATIONS = [
+    (1, 'add range and join indexes', [
+        "create index intervals_to_from_type on intervals (`to`, `from`, `type`)",
+        "create index intervals_type_to on intervals (`type`, `to`)",
+        "create index types_name on types (`name`)",
+        "create index types_parent on types (parent)",
+    ]),
+    (2, 'add sync state table', [
+        "create table sync_state(\n"
+        "    `name` varchar(64) not null,\n"
+        "    `value` int not null,\n"
+        "    primary key (`name`)\n"
+        "    )",
+    ]),
+    (3, 'add daily type rollup table', [
+        "create table daily_type_rollup(\n"
+        "    `date` char(8) not null,\n"
+        "    `type` char(36) not null,\n"
+        "    day_start int not null,\n"
+        "    seconds int not null,\n"
+        "    num int not null,\n"
+        "    shortest int not null,\n"
+        "    longest int not null,\n"
+        "    primary key (`date`, `type`)\n"
+        "    )",
+        "create index daily_type_rollup_day_start on daily_type_rollup (day_start)",
+        ('data', 'rebuild_rollup'),
+    ]),
+    (4, 'add mergeable statistics to daily rollup', [
+        "alter table daily_type_rollup add column m2 double not null default 0",
+        "alter table daily_type_rollup add column sketch text",
+        ('data', 'rebuild_rollup'),
+    ]),
+]
+# key in `sync_state` for the time of the last successful interval sync
+SYNC_WATERMARK = 'intervals_synced'
+# key in `sync_state` for the end of history written by an unfinished rebuild
+REBUILD_CHECKPOINT = 'rebuild_offset'
+# prefix of keys in `sync_state` for the latest migration each data step has run for, see migrate_data()
+DATA_STEP_STATE = 'data_step_'
+
+
+class MySQLBackend(object):
+    """MySQL server storage, the server has to be started before connecting."""
+    name = 'mysql'
+    param = '%s'
+
+    def connect(self):
+        """Open a new connection."""
+        # imported here so the sqlite backend runs without the MySQL driver
+        import mysql.connector
+        return mysql.connector.connect(**DB_CONFIG)
+
+    def check(self, cnx):
+        """Make sure an idle connection is still usable, reconnect otherwise."""
+        cnx.ping(reconnect=True)
+
+    def switch(self, onoff):
+        """
+        Turn on/off MySQL server.
+        :param onoff: An integer 0 for Off, 1 for On
+        """
+        import commands
+        if onoff == 0:
+            print commands.getstatusoutput("mysql.server stop")
+        elif onoff == 1:
+            print commands.getstatusoutput("mysql.server start")
+
+    def truncate(self, table):
+        """Return statement to delete all rows in a table."""
+        return "truncate table " + table
+
+    def database(self):
+        """Return a tuple telling which database connections go to."""
+        return self.name, DB_CONFIG['host'], DB_CONFIG['database']
+
+    def explain(self, cursor, query):
+        """
+        Explain a select query.
+        :return: (list) one dict per table in the plan, with keys table, type (access type) and key (index used).
+        """
+        cursor.execute("explain " + query)
+        columns = [x[0] for x in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+class SQLiteBackend(object):
+    """Embedded SQLite storage in SQLITE_PATH, in WAL mode. No server to start or stop."""
+    name = 'sqlite'
+    param = '?'
+
+    def connect(self):
+        """Open a new connection."""
+        cnx = sqlite3.connect(SQLITE_PATH)
+        cnx.execute("pragma journal_mode=wal")
+        cnx.execute("pragma synchronous=normal")
+        return cnx
+
+    def check(self, cnx):
+        """Embedded connections do not go stale."""
+        pass
+
+    def switch(self, onoff):
+        """Nothing to turn on or off."""
+        pass
+
+    def truncate(self, table):
+        """Return statement to delete all rows in a table."""
+        return "delete from " + table
+
+    def database(self):
+        """Return a tuple telling which database connections go to."""
+        return self.name, os.path.abspath(SQLITE_PATH)
+
+    def explain(self, cursor, query):
+        """
+        Explain a select query, translating SQLite plan into the keys of MySQL EXPLAIN.
+        :return: (list) one dict per table in the plan, with keys table, type (access type) and key (index used).
+        """
+        cursor.execute("explain query plan " + query)
+        plan = []
+        for row in cursor.fetchall():
+            step = re.match(r"(SCAN|SEARCH) (?:TABLE )?(\w+)(?: AS \w+)?(?: USING (?:\w+ )*INDEX (\w+))?", row[-1])
+            if step:
+                access, table, key = step.groups()
+                plan.append({'table': table, 'type': 'ALL' if access == 'SCAN' and not key else 'ref',
+                             'key': key, 'detail': row[-1]})
+        return plan
+
+
+BACKENDS = {'mysql': MySQLBackend, 'sqlite': SQLiteBackend}
+
+
+def get_backend():
+    """Return the storage backend in use."""
+    return BACKENDS[_BACKEND['name']]()
+
+
+def database_key():
+    """Return a tuple telling which database is in use, backend and SQLite file or MySQL server included."""
+    return get_backend().database()
+
+
+@contextmanager
+def use_backend(name):
+    """
+    Switch storage backend for the block.
+    :param name: (str) 'mysql' or 'sqlite'.
+    """
+    previous = _BACKEND['name']
+    _BACKEND['name'] = name
+    try:
+        yield get_backend()
+    finally:
+        _BACKEND['name'] = previous
+
+
+def sql(statement):
+    """
+    Adapt `%s` placeholders in a statement to the parameter style of the backend in use.
+    :param statement: A string of SQL statement.
+    :return: (str) statement.
+    """
+    return statement.replace('%s', get_backend().param)
 
 
 def mysql_switch(onoff):
     """
-    Turn on/off MySQL server.
+    Turn on/off MySQL server. Embedded backends have nothing to turn on or off.
     :param onoff: An integer 0 for Off, 1 for On
     """
-    import commands
-    if onoff == 0:
-        print commands.getstatusoutput("mysql.server stop")
-    elif onoff == 1:
-        print commands.getstatusoutput("mysql.server start")
+    get_backend().switch(onoff)
 
 
 def connect_db():
-    """Connect database and return connection, cursor."""
-    config = {
-      'user': 'root',
-      'password': 'root',
-      'host': 'localhost',
-      'database': 'time',
-      'raise_on_warnings': True,
-    }
-    cnx = mysql.connector.connect(**config)
+    """
+    Connect database of the backend in use and return connection, cursor.
+    Inside db_session() an idle connection is reused instead of opening a new one.
+    Give the connection back with release_db() instead of closing it.
+    """
+    backend = get_backend()
+    idle = _SESSION['idle'].setdefault(backend.name, [])
+    if _SESSION['depth'] and idle:
+        cnx = idle.pop()
+        backend.check(cnx)
+        counter = 'reused'
+    else:
+        cnx = backend.connect()
+        counter = 'opened'
+    POOL_STATS[counter] += 1
+    if _SESSION['depth']:
+        _SESSION['stats'][counter] += 1
     cursor = cnx.cursor()
     return cnx, cursor
 
 
+def release_db(cnx):
+    """
+    Give back a connection from connect_db(). It is kept for reuse inside db_session(), closed otherwise.
+    :param cnx: connection from connect_db().
+    """
+    if _SESSION['depth']:
+        _SESSION['idle'].setdefault(_BACKEND['name'], []).append(cnx)
+    else:
+        cnx.close()
+
+
+@contextmanager
+def db_session():
+    """
+    Share database connections between all connect_db() calls in the block, e.g. a whole report run.
+    Sessions can be nested, connections are closed when the outermost one exits.
+    Usage:
+        with db_session() as stats:
+            ...
+        print stats['opened'], stats['reused']
+    :return: (dict) counters for connections opened and reused in the outermost session, from zero.
+    """
+    if _SESSION['depth'] == 0:
+        _SESSION['stats'] = {'opened': 0, 'reused': 0}
+    _SESSION['depth'] += 1
+    try:
+        yield _SESSION['stats']
+    finally:
+        _SESSION['depth'] -= 1
+        if _SESSION['depth'] == 0:
+            for idle in _SESSION['idle'].values():
+                while idle:
+                    idle.pop().close()
+
+
 def empty_db(table='both', op='truncate'):
     """
     Empty time database for reconstruction.
@@ -37,8 +275,8 @@ def empty_db(table='both', op='truncate'):
     cnx, cursor = connect_db()
     echo, query1, query2 = ("",)*3
     if op == 'truncate':
-        query1 = "truncate table intervals"
-        query2 = "truncate table types"
+        query1 = get_backend().truncate('intervals')
+        query2 = get_backend().truncate('types')
         echo = 'Database is truncated.'
     elif op == 'drop':
         query1 = 'drop table intervals'
@@ -47,12 +285,24 @@ def empty_db(table='both', op='truncate'):
     if table == 'both':
         cursor.execute(query1)
         cursor.execute(query2)
+        if op == 'drop':
+            # indexes are gone with the tables, so migrations have to run again
+            cursor.execute('drop table if exists daily_type_rollup')
+            cursor.execute('drop table if exists sync_state')
+            cursor.execute('drop table if exists schema_version')
+        else:
+            # a rebuild starts syncing from scratch, the emptied rollup is still up to date
+            cursor.execute(get_backend().truncate('daily_type_rollup'))
+            cursor.execute(sql("delete from sync_state where `name` not like %s"), (DATA_STEP_STATE + '%',))
     elif table == 'intervals':
         cursor.execute(query1)
+        if op == 'truncate':
+            cursor.execute(get_backend().truncate('daily_type_rollup'))
     elif table == 'types':
         cursor.execute(query2)
     cnx.commit()
-    cnx.close()
+    release_db(cnx)
+    TYPES_WRITTEN['count'] += 1
     print echo
 
 
@@ -73,7 +323,7 @@ def create_types_table():
                     "    )")
     cursor.execute(create_types)
     cnx.commit()
-    cnx.close()
+    release_db(cnx)
 
 
 def create_intervals_table():
@@ -91,61 +341,350 @@ def create_intervals_table():
                         "    )")
     cursor.execute(create_intervals)
     cnx.commit()
-    cnx.close()
+    release_db(cnx)
 
 
 def create_all_tables():
-    """Create all necessary tables in database"""
+    """Create all necessary tables in database, then bring the schema to the latest version."""
     create_types_table()
     create_intervals_table()
+    migrate_db()
 
 
-def insert_types(json):
+def create_schema_table(cursor):
     """
-    Insert types data into database. Insertion will update existing data.
-    :param json: A list of dict contain types data from aTimeLogger.
+    Create `schema_version` table if it does not exist yet.
+    :param cursor: cursor from connect_db().
+    """
+    create_schema = ("create table if not exists schema_version(\n"
+                     "    version int not null,\n"
+                     "    description varchar(255) not null,\n"
+                     "    applied int not null,\n"
+                     "    primary key (version)\n"
+                     "    )")
+    cursor.execute(create_schema)
+
+
+def get_schema_version():
+    """Return the latest migration version applied to database, 0 for a database never migrated."""
+    cnx, cursor = connect_db()
+    create_schema_table(cursor)
+    cnx.commit()
+    cursor.execute("select max(version) from schema_version")
+    version = cursor.fetchone()[0]
+    release_db(cnx)
+    return version or 0
+
+
+def migrate_db():
+    """
+    Upgrade database in place by applying every migration in MIGRATIONS newer than its schema version.
+    A statement is either SQL or a data step filling tables from existing data.
+    Each migration is recorded in `schema_version` once its SQL statements succeed.
+    Data steps are code of today, written for the latest schema only, so they run after SQL of every migration,
+    see migrate_data().
+    :return: (int) schema version after migration.
+    """
+    version = get_schema_version()
+    pending = [m for m in MIGRATIONS if m[0] > version]
+    if pending:
+        cnx, cursor = connect_db()
+        for number, description, statements in pending:
+            for statement in statements:
+                if not is_data_step(statement):
+                    cursor.execute(statement)
+            cursor.execute(sql("insert into schema_version (version, description, applied) values (%s, %s, %s)"),
+                           (number, description, int(time.time())))
+            cnx.commit()
+            version = number
+            print "Migrated database to version {0}: {1}.".format(number, description)
+        release_db(cnx)
+    migrate_data(version)
+    return version
+
+
+def is_data_step(statement):
+    """Tell if a statement of MIGRATIONS is a data step ('data', name) instead of SQL."""
+    return isinstance(statement, tuple) and statement[0] == 'data'
+
+
+def migrate_data(version):
+    """
+    Run the data steps of migrations up to version that have not run since the latest migration asking for them.
+    A step asked for by several migrations, e.g. rebuilding the same table, runs once for all of them.
+    Each step records the migration it has run for in `sync_state` when it succeeds,
+    so a failed step is run again by the next call.
+    :param version: (int) schema version of database, latest after migrate_db().
+    """
+    steps = OrderedDict()
+    for number, description, statements in MIGRATIONS:
+        if number <= version:
+            for statement in statements:
+                if is_data_step(statement):
+                    steps[statement[1]] = number
+    for name, number in steps.items():
+        if (get_sync_state(DATA_STEP_STATE + name) or 0) < number:
+            DATA_STEPS[name]()
+            set_sync_state(DATA_STEP_STATE + name, number)
+
+
+def data_step_done(name):
+    """
+    Tell if a data step has run for the latest migration asking for it, e.g. 'rebuild_rollup' once
+    `daily_type_rollup` can be read. False for a database not migrated that far yet.
+    :param name: (str) a key of DATA_STEPS.
+    :return: (bool)
+    """
+    needed = max(number for number, description, statements in MIGRATIONS if ('data', name) in statements)
+    if get_schema_version() < needed:
+        return False
+    return (get_sync_state(DATA_STEP_STATE + name) or 0) >= needed
+
+
+def get_sync_state(name):
+    """
+    Read a value recorded by set_sync_state().
+    :param name: A string for state name, e.g. SYNC_WATERMARK.
+    :return: (int) value, None if never recorded.
     """
     cnx, cursor = connect_db()
-    for item in json:
-        guid = '"%s"' % item['guid']
-        group = 1 if item['group'] else 0
-        name = '"%s"' % item['name']
-        parent = '"%s"' % item['parent']['guid'] if item['parent'] else "NULL"
-        order = item['order']
-        color = item['color']
-        deleted = 1 if item['deleted'] else 0
-        revision = item['revision']
-        image_id = '"%s"' % item['imageId']
-        insert = "replace into types \
-                (guid, `group`, `name`, parent, `order`, color, deleted, revision, imageId) \
-                values ({0}, {1}, {2}, {3}, {4}, {5}, {6}, {7}, {8})" \
-                .format(guid, group, name, parent, order, color, deleted, revision, image_id)
-        cursor.execute(insert)
+    cursor.execute(sql("select `value` from sync_state where `name` = %s"), (name,))
+    row = cursor.fetchone()
+    release_db(cnx)
+    return row[0] if row else None
+
+
+def set_sync_state(name, value):
+    """
+    Record a sync value, e.g. the high-water mark of the last successful sync.
+    :param name: A string for state name.
+    :param value: (int) value to record, usually a unix timestamp.
+    """
+    cnx, cursor = connect_db()
+    cursor.execute(sql("replace into sync_state (`name`, `value`) values (%s, %s)"), (name, value))
+    cnx.commit()
+    release_db(cnx)
+
+
+def clear_sync_state(name):
+    """
+    Forget a value recorded by set_sync_state().
+    :param name: A string for state name.
+    """
+    cnx, cursor = connect_db()
+    cursor.execute(sql("delete from sync_state where `name` = %s"), (name,))
+    cnx.commit()
+    release_db(cnx)
+
+
+def explain_query(query):
+    """
+    Run EXPLAIN on a select query.
+    :param query: A string of select query.
+    :return: (list) one dict per table in the plan, with keys table, type (access type, 'ALL' for full scan)
+        and key (index used), see explain() of the backends.
+    """
+    cnx, cursor = connect_db()
+    plan = get_backend().explain(cursor, query)
+    release_db(cnx)
+    return plan
+
+
+def chunked(iterable, size):
+    """
+    Split an iterable into lists of at most `size` items.
+    :param iterable: any iterable.
+    :param size: (int) maximum length of each chunk.
+    :return: generator of lists.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            break
+        yield chunk
+
+
+def bulk_replace(table, columns, rows, chunk_size=BULK_CHUNK):
+    """
+    Upsert rows into a table with parameterized `replace into`, one transaction per chunk.
+    :param table: A string for table name in database.
+    :param columns: (list) column names, in the same order as values in each row.
+    :param rows: An iterable of tuples to insert.
+    :param chunk_size: (int) number of rows sent in one executemany() and committed together.
+    :return: (int) number of rows written.
+    """
+    cnx, cursor = connect_db()
+    insert = "replace into {0} ({1}) values ({2})".format(
+        table, ", ".join("`%s`" % x for x in columns), ", ".join([get_backend().param] * len(columns)))
+    total = 0
+    begin = time.time()
+    for chunk in chunked(rows, chunk_size):
+        cursor.executemany(insert, chunk)
         cnx.commit()
-    cnx.close()
+        total += len(chunk)
+    release_db(cnx)
+    elapsed = time.time() - begin
+    rate = total / elapsed if elapsed > 0 else float(total)
+    print "Wrote {0} rows into {1} in {2:.2f}s ({3:.0f} rows/sec).".format(total, table, elapsed, rate)
+    return total
+
+
+def type_row(item):
+    """
+    Transform one type from aTimeLogger into a row of `types` table.
+    :param item: A dict contain one type data.
+    :return: (tuple) values in the order of TYPE_COLUMNS.
+    """
+    return (item['guid'],
+            1 if item['group'] else 0,
+            item['name'],
+            item['parent']['guid'] if item['parent'] else None,
+            item['order'],
+            item['color'],
+            1 if item['deleted'] else 0,
+            item['revision'],
+            item['imageId'])
 
 
-def insert_intervals(json):
+def interval_row(item):
+    """
+    Transform one interval from aTimeLogger into a row of `intervals` table.
+    :param item: A dict contain one interval data.
+    :return: (tuple) values in the order of INTERVAL_COLUMNS.
+    """
+    return (item['guid'],
+            item['type']['guid'],
+            item['from'],
+            item['to'],
+            item['to'] - item['from'],
+            item['comment'] if item['comment'] else None,
+            item['activityGuid'])
+
+
+def insert_types(json, chunk_size=BULK_CHUNK):
     """
     Insert types data into database. Insertion will update existing data.
+    :param json: A list of dict contain types data from aTimeLogger.
+    :param chunk_size: (int) number of rows committed in one transaction.
+    :return: (int) number of rows written.
+    """
+    TYPES_WRITTEN['count'] += 1
+    return bulk_replace('types', TYPE_COLUMNS, (type_row(x) for x in json), chunk_size)
+
+
+def insert_intervals(json, chunk_size=BULK_CHUNK):
+    """
+    Insert intervals data into database. Insertion will update existing data.
+    Rollup of the local days covered by the intervals, before and after the update, is refreshed.
     :param json: A list of dict contain intervals data from aTimeLogger.
+    :param chunk_size: (int) number of rows committed in one transaction.
+    :return: (int) number of rows written.
+    """
+    rows = [interval_row(x) for x in json]
+    spans = stored_spans([x[0] for x in rows], chunk_size) + [(x[2], x[3]) for x in rows]
+    total = bulk_replace('intervals', INTERVAL_COLUMNS, rows, chunk_size)
+    for start, end in day_ranges(spans):
+        refresh_rollup(start, end)
+    return total
+
+
+def stored_spans(guids, chunk_size=BULK_CHUNK):
+    """
+    Look up time spans of intervals already in database, the days an update moves them away from.
+    :param guids: (list) interval guids.
+    :param chunk_size: (int) number of guids in one query.
+    :return: (list) tuples of (from, to) unix timestamps.
     """
     cnx, cursor = connect_db()
-    for item in json:
-        guid = '"%s"' % item['guid']
-        type1 = '"%s"' % item['type']['guid']
-        from1 = item['from']
-        to = item['to']
-        delta = item['to'] - item['from']
-        comment = '"%s"' % item['comment'] if item['comment'] else "NULL"
-        activity_guid = '"%s"' % item['activityGuid']
-        insert = "replace into intervals \
-                (guid, `type`, `from`, `to`, delta, `comment`, activityGuid) \
-                values ({0}, {1}, {2}, {3}, {4}, {5}, {6})" \
-                .format(guid, type1, from1, to, delta, comment, activity_guid)
-        cursor.execute(insert)
-        cnx.commit()
-    cnx.close()
+    spans = []
+    for chunk in chunked(guids, chunk_size):
+        query = "select `from`, `to` from intervals where guid in ({0})".format(
+            ", ".join([get_backend().param] * len(chunk)))
+        cursor.execute(query, chunk)
+        spans.extend(cursor.fetchall())
+    release_db(cnx)
+    return spans
+
+
+def day_ranges(spans):
+    """
+    Merge time spans into ranges of whole local days.
+    :param spans: (list) tuples of (from, to) unix timestamps.
+    :return: (list) tuples of (start, end) unix timestamps of local midnights, in time order.
+    """
+    merged = []
+    for lo, hi in sorted(spans):
+        # spans less than a day apart share or neighbour a day, refresh them together
+        if merged and lo - merged[-1][1] < 24 * 3600:
+            merged[-1][1] = max(merged[-1][1], hi)
+        else:
+            merged.append([lo, hi])
+    if not merged:
+        return []
+    calendar = calendar_between(merged[0][0], merged[-1][1])
+    return [(calendar.floor(lo, 0), calendar.next_bound(max(lo, hi - 1), 0)) for lo, hi in merged]
+
+
+def refresh_rollup(start, end):
+    """
+    Recompute `daily_type_rollup` of the local days between start and end from `intervals`.
+    Intervals crossing midnight are split, so each day holds only the seconds spent in it.
+    Besides sum, count, min and max, each day keeps m2 (sum of squared deviations from the mean)
+    and a quantile sketch, so Std and Median of longer periods can be merged from days, see sketch.py.
+    :param start: (int) unix timestamp of a local midnight.
+    :param end: (int) unix timestamp of a later local midnight.
+    :return: (int) number of rollup rows written.
+    """
+    calendar = calendar_between(start, end)
+    first, last = calendar.floor_index(start, 0), calendar.floor_index(end, 0)
+    days = calendar.bounds[0][first:last + 1].tolist()
+    keys = [x.strftime('%Y%m%d') for x in calendar.starts[0][first:last]]
+    cnx, cursor = connect_db()
+    cursor.execute(sql("select `type`, `from`, `to` from intervals where `to` > %s and `from` < %s"), (start, end))
+    pieces = {}
+    for type_guid, lo, hi in cursor.fetchall():
+        lo, hi = max(lo, start), min(hi, end)
+        ind = bisect_right(days, lo) - 1
+        while True:
+            pieces.setdefault((ind, type_guid), []).append(min(hi, days[ind + 1]) - max(lo, days[ind]))
+            ind += 1
+            if days[ind] >= hi:
+                break
+    rows = []
+    for (ind, type_guid), values in sorted(pieces.items()):
+        moments = Moments.from_values(values)
+        rows.append((keys[ind], type_guid, days[ind], sum(values), moments.n, moments.low, moments.high,
+                     moments.m2, QuantileSketch.from_values(values).to_json()))
+    insert = "insert into daily_type_rollup ({0}) values ({1})".format(
+        ", ".join("`%s`" % x for x in ROLLUP_COLUMNS), ", ".join([get_backend().param] * len(ROLLUP_COLUMNS)))
+    # delete and insert in one transaction, readers never see a day half written
+    cursor.execute(sql("delete from daily_type_rollup where day_start >= %s and day_start < %s"), (start, end))
+    for chunk in chunked(rows, BULK_CHUNK):
+        cursor.executemany(insert, chunk)
+    cnx.commit()
+    release_db(cnx)
+    return len(rows)
+
+
+def rebuild_rollup():
+    """
+    Recompute the whole `daily_type_rollup` table from `intervals`.
+    :return: (int) number of rollup rows written.
+    """
+    cnx, cursor = connect_db()
+    cursor.execute("select min(`from`), max(`to`) from intervals")
+    first, last = cursor.fetchone()
+    release_db(cnx)
+    if first is None:
+        return 0
+    total = sum(refresh_rollup(start, end) for start, end in day_ranges([(first, last)]))
+    print "Rebuilt daily rollup, {0} rows.".format(total)
+    return total
+
+
+# functions run by data steps ('data', name) of MIGRATIONS
+DATA_STEPS = {'rebuild_rollup': rebuild_rollup}
 
 
 def insert_all(types, intervals):
@@ -156,3 +695,25 @@ def insert_all(types, intervals):
     """
     insert_types(types)
     insert_intervals(intervals)
+
+
+def copy_db(source='mysql', target='sqlite', chunk_size=BULK_CHUNK):
+    """
+    One-shot copy of the whole database from one backend to another, e.g. from MySQL to SQLite.
+    Target tables are created from scratch, so target database has to be empty.
+    :param source: (str) backend to read from.
+    :param target: (str) backend to write into.
+    :param chunk_size: (int) number of rows committed in one transaction.
+    """
+    with use_backend(source):
+        migrate_db()
+        src = get_backend().connect()
+    cursor = src.cursor()
+    with use_backend(target):
+        create_all_tables()
+        for table, columns in [('types', TYPE_COLUMNS), ('intervals', INTERVAL_COLUMNS),
+                               ('daily_type_rollup', ROLLUP_COLUMNS), ('sync_state', ['name', 'value'])]:
+            cursor.execute("select {0} from {1}".format(", ".join("`%s`" % x for x in columns), table))
+            bulk_replace(table, columns, cursor, chunk_size)
+    src.close()
+    print "Copied database from {0} to {1}.".format(source, target)
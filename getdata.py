@@ -1,9 +1,39 @@
 """This module are functions for retrieving data from database and transform to desired format."""
 from time_func import *
-from db import connect_db
+from db import connect_db, release_db, explain_query, data_step_done, database_key, TYPES_WRITTEN
 import numpy as np
+import time
 import pandas as pd
 
+SLEEP_QUERY = """select intervals.`from`, intervals.`to`, delta
+        from types, intervals
+        where intervals.type = types.guid and
+        types.name = 'Sleep' and
+        intervals.`to` > {0} and
+        intervals.`to` < {1}
+        order by intervals.`to`"""
+DATA_QUERY = """select intervals.`from`, intervals.`to`, delta, a.name, b.name, comment
+        from types a, types b, intervals
+        where intervals.type = a.guid and
+        a.parent = b.guid and
+        intervals.`to` > {0} and
+        intervals.`from` < {1}
+        order by intervals.`to`"""
+TYPE_REGISTRY_QUERY = """select a.name, a.color, a.`group`, a.`order`, b.name, b.`order`, a.revision
+        from types a left join types b
+        on a.parent = b.guid"""
+TYPES_VERSION_QUERY = """select max(revision), count(*) from types"""
+ROLLUP_QUERY = """select r.day_start, r.seconds, r.num, r.shortest, r.longest, r.m2, r.sketch, a.name, b.name
+        from types a, types b, daily_type_rollup r
+        where r.type = a.guid and
+        a.parent = b.guid and
+        r.day_start >= {0} and
+        r.day_start < {1}
+        order by r.day_start"""
+# seconds a cached TypeRegistry is trusted before checking types revision again
+TYPE_CACHE_TTL = 60
+_REGISTRY = {}
+
 
 def get_sleep_data(start, end):
     """
@@ -13,16 +43,10 @@ def get_sleep_data(start, end):
     :return: a list of tuples (start, end, duration).
     """
     cnx, cursor = connect_db()
-    query = """select intervals.from, intervals.to, delta
-            from types, intervals
-            where intervals.type = types.guid and
-            types.name = 'Sleep' and
-            intervals.to > {0} and
-            intervals.to < {1}
-            order by intervals.to""".format(start, end)
+    query = SLEEP_QUERY.format(start, end)
     cursor.execute(query)
     sleep_entries = cursor.fetchall()
-    cnx.close()
+    release_db(cnx)
     return sleep_entries
 
 
@@ -34,10 +58,19 @@ def get_sleep_dataframe(start, end):
     :param end: (int) unix timestamp for end point.
     :return: a DataFrame with column (date) date, (int) delta
     """
-    entries = get_sleep_data(start, end)
-    dataframe = pd.DataFrame(entries, columns=['from', 'to', 'delta'])
-    dataframe['date'] = dataframe['from'].apply(
-        lambda x: ts2date(ts2datetime(x).replace(days=1)) if ts2datetime(x).hour >= 19 else ts2date(x))
+    return sleep_dataframe(get_sleep_data(start, end))
+
+
+def sleep_dataframe(entries):
+    """
+    Aggregate sleep entries by date, see get_sleep_dataframe().
+    :param entries: a list of tuples (start, end, duration) or a DataFrame with these columns.
+    :return: a DataFrame with column (date) date, (int) delta
+    """
+    dataframe = pd.DataFrame(entries, columns=['from', 'to', 'delta']).reset_index(drop=True)
+    calendar = local_calendar(dataframe['from'])
+    next_day = pd.to_timedelta((calendar['hour'] >= 19).astype(int), unit='D')
+    dataframe['date'] = (calendar['day'] + next_day).dt.date
 
     # aggregate duplicate date duration
     agg_duration = dataframe[['delta', 'date']].groupby('date').aggregate(np.sum)
@@ -52,16 +85,10 @@ def get_sleep_dataframe(start, end):
 
 def get_data(start, end):
     cnx, cursor = connect_db()
-    query = """select intervals.from, intervals.to, delta, a.name, b.name, comment
-            from types a, types b, intervals
-            where intervals.type = a.guid and
-            a.parent = b.guid and
-            intervals.to > {0} and
-            intervals.from < {1}
-            order by intervals.to""".format(start, end)
+    query = DATA_QUERY.format(start, end)
     cursor.execute(query)
     entries = cursor.fetchall()
-    cnx.close()
+    release_db(cnx)
     return entries
 
 
@@ -78,7 +105,17 @@ def get_cut_dataframe(start, end):
     :param end: (int) unix timestamp for end point.
     :return: (DataFrame)
     """
-    data = get_dataframe(start, end)
+    return cut_range(get_dataframe(start, end), start, end)
+
+
+def cut_range(data, start, end):
+    """
+    Cut first and last row of entries into start and end time, see get_cut_dataframe().
+    :param data: (DataFrame) entries from get_dataframe(), changed in place.
+    :param start: (int) unix timestamp for start point.
+    :param end: (int) unix timestamp for end point.
+    :return: (DataFrame)
+    """
     nrow = data.shape[0]
     data.ix[0, 'from'] = start
     data.ix[0, 'delta'] = data.ix[0, 'to'] - start
@@ -98,7 +135,7 @@ def get_cut_day_dataframe(start, end):
     """
     entries = get_dataframe(start, end)
     data = entries.copy()
-    data['datetime'] = data['to'].map(ts2date)
+    data['datetime'] = local_calendar(data['to'])['date']
 
     point = arrow.Arrow.range('day', ts2datetime(start), ts2datetime(end))
     point = [x.timestamp for x in point]
@@ -130,82 +167,269 @@ def get_cut_day_dataframe(start, end):
             ind += 1
         if ind >= len(point):
             break
-    data['datetime'] = data['from'].map(ts2datetime)
+    data['datetime'] = local_calendar(data['from'])['datetime']
     return data
 
 
+def split_at_points(data, points):
+    """
+    Split every row crossing one or more points into one row per piece, vectorized with np.searchsorted.
+    :param data: (DataFrame) rows with columns from, to, delta.
+    :param points: (list) sorted unix timestamps, e.g. from break_level().
+    :return: (DataFrame) same columns, pieces of a row in time order, index reset.
+    """
+    points = np.asarray(points, dtype=np.int64)
+    if len(points) == 0 or data.shape[0] == 0:
+        return data.reset_index(drop=True)
+    # points strictly inside (from, to) of each row
+    first = np.searchsorted(points, data['from'].values, side='right')
+    last = np.searchsorted(points, data['to'].values, side='left')
+    counts = np.maximum(last - first, 0) + 1
+    rows = np.repeat(np.arange(data.shape[0]), counts)
+    # position of each piece in its row
+    piece = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+    point_ind = np.repeat(first, counts) + piece
+    is_last = piece == np.repeat(counts, counts) - 1
+    result = data.iloc[rows].reset_index(drop=True)
+    result['from'] = np.where(piece == 0, result['from'].values,
+                              points[np.clip(point_ind - 1, 0, len(points) - 1)])
+    result['to'] = np.where(is_last, result['to'].values, points[np.clip(point_ind, 0, len(points) - 1)])
+    result['delta'] = result['to'] - result['from']
+    return result
+
+
 def get_cut_level_dataframe(start, end, level):
     """
-    Cut all cross-day rows in dataframe into two rows for two days.
+    Cut all rows crossing the boundaries of given time frame into one row per period.
     :param level: (int) time frame number
     :param start: (int) unix timestamp for start point.
     :param end: (int) unix timestamp for end point.
     :return: (DataFrame)
     """
-    entries = get_cut_dataframe(start, end)
-    data = entries.copy()
-    break_point = break_level(start, end, level)
-    if len(break_point) != 0:
-        data['datetime'] = data['to'].map(ts2date)
-
-        ind = 0
-        new_row = 0
-        for index, row in entries.iterrows():
-            if row['to'] == break_point[ind]:
-                ind += 1
-            elif row['from'] < break_point[ind] < row['to']:
-                row = entries.iloc[[index]].copy()
-                row.ix[index, 'delta'] = abs(break_point[ind]-row.ix[index, 'from'])
-                row.ix[index, 'to'] = break_point[ind]
-                row.ix[index, 'datetime'] = ts2date(row.ix[index, 'from'])
-                new_ind = index + new_row
-                data.ix[new_ind, 'delta'] = abs(break_point[ind]-data.ix[new_ind, 'to'])
-                data.ix[new_ind, 'from'] = break_point[ind]
-                data = pd.concat([data[:new_ind], row, data[new_ind:]])
-                data = data.reset_index(drop=True)
-                new_row += 1
-                ind += 1
-            if ind >= len(break_point):
-                break
+    return cut_level(get_cut_dataframe(start, end), start, end, level)
 
-    data['datetime'] = data['from'].map(ts2datetime)
-    data['date_agg'] = data['from'].map(lambda x: ts2str_level(x, level))
+
+def cut_level(data, start, end, level):
+    """
+    Split cut entries at the boundaries of given time frame, see get_cut_level_dataframe().
+    :param data: (DataFrame) entries from get_cut_dataframe().
+    :param start: (int) unix timestamp for start point.
+    :param end: (int) unix timestamp for end point.
+    :param level: (int) time frame number
+    :return: (DataFrame)
+    """
+    data = split_at_points(data, break_level(start, end, level))
+    calendar = local_calendar(data['from'])
+    data['datetime'] = calendar['datetime']
+    data['date_agg'] = calendar[LEVEL2KEY[level]]
+    return data
+
+
+def get_rollup_dataframe(start, end):
+    """
+    Get daily totals of each type from `daily_type_rollup`, no raw intervals are read.
+    :param start: (int) unix timestamp of a local midnight.
+    :param end: (int) unix timestamp of a local midnight.
+    :return: (DataFrame) columns day_start, seconds, num, shortest, longest, m2, sketch, type, group.
+    """
+    cnx, cursor = connect_db()
+    cursor.execute(ROLLUP_QUERY.format(start, end))
+    rows = cursor.fetchall()
+    release_db(cnx)
+    data = pd.DataFrame(rows, columns=['day_start', 'seconds', 'num', 'shortest', 'longest', 'm2', 'sketch',
+                                       'type', 'group'])
     return data
 
 
 def get_group_order():
     """Return group order in dataframe."""
-    cnx, cursor = connect_db()
-    query = """select name, `order` from types where `group`=1"""
-    cursor.execute(query)
-    result = cursor.fetchall()
-    result = pd.DataFrame(result, columns=['group', 'order'])
-    cnx.close()
-    return result
+    return get_type_registry().group_order()
 
 
 def get_type_order(group):
     """Return group order in dataframe.
     :param group: str, group name
     """
-    cnx, cursor = connect_db()
-    query = """select a.name, a.`order` from types a, types b
-            where a.parent=b.guid and
-            b.name='{0}'""".format(group)
-    cursor.execute(query)
-    result = cursor.fetchall()
-    result = pd.DataFrame(result, columns=['type', 'order'])
-    cnx.close()
-    return result
+    return get_type_registry().type_order(group)
 
 
 def get_all_types():
     """Return all types name and order in dataframe."""
-    cnx, cursor = connect_db()
-    query = """select a.name, b.`order` from types a, types b
-            where a.parent=b.guid"""
-    cursor.execute(query)
-    result = cursor.fetchall()
-    result = pd.DataFrame(result, columns=['type', 'order'])
-    cnx.close()
+    return get_type_registry().all_types()
+
+
+def check_query_plans(start=None, end=None):
+    """
+    EXPLAIN the queries of this module and report how each table is read.
+    A full table scan (access type 'ALL') on intervals means the indexes from db.migrate_db() are missing or unused.
+    :param start: (int) unix timestamp for start point, default last 7 days.
+    :param end: (int) unix timestamp for end point.
+    :return: (DataFrame) columns query, table, access, key, full_scan
+    """
+    if start is None or end is None:
+        start, end = human_qr('last 7 days')
+    queries = {'sleep': SLEEP_QUERY.format(start, end),
+               'data': DATA_QUERY.format(start, end),
+               'rollup': ROLLUP_QUERY.format(start, end),
+               'types': TYPE_REGISTRY_QUERY}
+    rows = []
+    for name, query in sorted(queries.items()):
+        for step in explain_query(query):
+            rows.append((name, step['table'], step['type'], step['key'], step['type'] == 'ALL'))
+    result = pd.DataFrame(rows, columns=['query', 'table', 'access', 'key', 'full_scan'])
+    scans = result[result.full_scan & (result.table == 'intervals')]
+    if scans.shape[0] != 0:
+        print "Full scan on intervals in: {0}".format(", ".join(scans['query'].unique()))
     return result
+
+
+class TypeRegistry(object):
+    """
+    All types loaded with one query and indexed by name, for palette, group order and type order.
+    Holds no connection, so it can be shared by reports or sent to other processes.
+    """
+
+    def __init__(self):
+        cnx, cursor = connect_db()
+        cursor.execute(TYPE_REGISTRY_QUERY)
+        rows = cursor.fetchall()
+        release_db(cnx)
+        table = pd.DataFrame(rows, columns=['name', 'color', 'is_group', 'order',
+                                            'group', 'group_order', 'revision'])
+        self.colors = {x[0]: '#' + format(x[1], 'x') for x in rows}
+        self.groups = table[table.is_group == 1][['name', 'order']].rename(columns={'name': 'group'})
+        self.types = table[table.group.notnull()].rename(columns={'name': 'type'})
+        self.types = self.types.astype({'group_order': int})
+        self.type_group = dict(zip(self.types.type, self.types.group))
+        self.group_types = {group: members[['type', 'order']].sort_values(by='order').reset_index(drop=True)
+                            for group, members in self.types.groupby('group')}
+        # same as TYPES_VERSION_QUERY, to tell when types have changed
+        self.version = (table.revision.max() if rows else None, len(rows))
+
+    def palette(self):
+        """Return the hexadecimal color code in a dictionary, see plot_help.get_palette()."""
+        return dict(self.colors)
+
+    def group_order(self):
+        """Return group order in dataframe, see get_group_order()."""
+        return self.groups.reset_index(drop=True)
+
+    def type_order(self, group):
+        """
+        Return order of types in given group in dataframe, see get_type_order().
+        :param group: str, group name
+        """
+        if group not in self.group_types:
+            return pd.DataFrame(columns=['type', 'order'])
+        return self.group_types[group].copy()
+
+    def all_types(self):
+        """Return all types name and their group order in dataframe, see get_all_types()."""
+        types = self.types[['type', 'group_order']].rename(columns={'group_order': 'order'})
+        return types.reset_index(drop=True)
+
+
+def get_type_registry():
+    """
+    Return the TypeRegistry cached for the whole process.
+    It is reloaded when types revision or count in database has changed, which is checked at most
+    every TYPE_CACHE_TTL seconds, and right away after types are written by db.insert_types()
+    or another database is used (backend or SQLite file).
+    :return: TypeRegistry
+    """
+    database = database_key()
+    registry = _REGISTRY.get('registry') if _REGISTRY.get('database') == database else None
+    fresh = registry is not None and _REGISTRY['written'] == TYPES_WRITTEN['count'] and \
+        time.time() - _REGISTRY['checked'] < TYPE_CACHE_TTL
+    if fresh:
+        return registry
+    cnx, cursor = connect_db()
+    cursor.execute(TYPES_VERSION_QUERY)
+    revision, count = cursor.fetchone()
+    release_db(cnx)
+    if registry is None or registry.version != (revision, count):
+        registry = TypeRegistry()
+    _REGISTRY.update(registry=registry, checked=time.time(), written=TYPES_WRITTEN['count'], database=database)
+    return registry
+
+
+class ReportSession(object):
+    """
+    Entries of a report time range and types metadata, both loaded once, and daily rollup rows once asked for.
+    Cut, level-cut, sleep and aggregated views are then computed from memory.
+    """
+
+    def __init__(self, start, end, types=None, data=None):
+        """
+        :param start: (int) unix timestamp for start point.
+        :param end: (int) unix timestamp for end point.
+        :param types: TypeRegistry to share, default load a new one.
+        :param data: (DataFrame) entries from get_dataframe() of the same range, default query database.
+        """
+        self.start = start
+        self.end = end
+        self.types = types if types is not None else get_type_registry()
+        self.data = data if data is not None else get_dataframe(start, end)
+        self._levels = {}
+
+    def period(self, start, end):
+        """
+        Return a ReportSession of a shorter range, entries are sliced from memory instead of queried.
+        Usage:
+            span = ReportSession(year_start, year_end)
+            day = span.period(day_start, day_end)
+        :param start: (int) unix timestamp for start point, not before the start of this session.
+        :param end: (int) unix timestamp for end point, not after the end of this session.
+        :return: ReportSession sharing types with this one.
+        """
+        data = self.data[(self.data.to > start) & (self.data['from'] < end)].reset_index(drop=True)
+        session = ReportSession(start, end, self.types, data)
+        if 'rollup' in self._levels:
+            rollup = self._levels['rollup']
+            if rollup is not None:
+                rollup = rollup[(rollup.day_start >= start) & (rollup.day_start < end)].reset_index(drop=True)
+            session._levels['rollup'] = rollup
+        return session
+
+    def cut(self):
+        """Return entries cut into start and end time, same as get_cut_dataframe()."""
+        if 'cut' not in self._levels:
+            self._levels['cut'] = cut_range(self.data.copy(), self.start, self.end)
+        return self._levels['cut'].copy()
+
+    def cut_level(self, level):
+        """
+        Return entries cut at the boundaries of time frame, same as get_cut_level_dataframe().
+        :param level: (int) time frame number
+        """
+        if level not in self._levels:
+            self._levels[level] = cut_level(self.cut(), self.start, self.end, level)
+        return self._levels[level].copy()
+
+    def rollup(self):
+        """
+        Return daily rollup rows of the range, same as get_rollup_dataframe(), queried once.
+        Sessions from period() slice the rows of this one if it has queried them.
+        :return: (DataFrame) None when database has no rollup to read yet, see db.migrate_db().
+        """
+        if 'rollup' not in self._levels:
+            ready = data_step_done('rebuild_rollup')
+            self._levels['rollup'] = get_rollup_dataframe(self.start, self.end) if ready else None
+        rollup = self._levels['rollup']
+        return rollup.copy() if rollup is not None else None
+
+    def sleep(self):
+        """Return sleep duration by date, same as get_sleep_dataframe()."""
+        entries = self.data[(self.data.type == 'Sleep') & (self.data.to < self.end)]
+        return sleep_dataframe(entries[['from', 'to', 'delta']])
+
+    def sleep_entries(self, start, end):
+        """
+        Return sleep entries ending between start and end, same as get_sleep_data().
+        :param start: (int) unix timestamp for start point.
+        :param end: (int) unix timestamp for end point.
+        :return: (DataFrame) columns from, to, delta.
+        """
+        data = self.data
+        entries = data[(data.type == 'Sleep') & (data.to > start) & (data.to < end)]
+        return entries[['from', 'to', 'delta']].reset_index(drop=True)
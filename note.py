@@ -1,13 +1,29 @@
 import evernote.edam.type.ttypes as ever_types
 from evernote.api.client import EvernoteClient
 import binascii
+import copy
 import hashlib
+import json
+import os
+from evernote.edam.error.ttypes import EDAMNotFoundException
 from analysis import LEVEL2STR
-from time_func import ts2datetime
+from time_func import TZINFO, ts2datetime
 import re
+import time
 
-DIARY = "c0e4e8e9-465f-4ebc-9053-88878e09eedf"
-REVIEW = '17caf5bc-7295-4e55-ac16-3d291f587946'
+# notebook of reports of each level by role, resolved to guid once and kept in NOTEBOOKS_FILE
+REPORT_NOTEBOOKS = {0: 'diary', 1: 'review', 2: 'review'}
+# guids of the notebooks of each role reports have always been sent to, used while they exist
+KNOWN_NOTEBOOKS = {'diary': 'c0e4e8e9-465f-4ebc-9053-88878e09eedf', 'review': '17caf5bc-7295-4e55-ac16-3d291f587946'}
+# names to find notebooks of each role by, when the known guid is gone.
+# Names default to a guess, set NOTE_DIARY and NOTE_REVIEW to the notebooks of your account.
+NOTEBOOK_NAMES = {'diary': os.environ.get('NOTE_DIARY', 'Diary'), 'review': os.environ.get('NOTE_REVIEW', 'Review')}
+NOTEBOOKS_FILE = 'notebooks.json'
+# seconds the list of notebooks is trusted before it is fetched again
+NOTEBOOK_TTL = 600
+# note guid and resource guids of each published report, see NotePublisher
+NOTE_INDEX_FILE = 'note_index.json'
+_CLIENT = {}
 DAILY_TAG = """<div>
     <ul style="list-style-type: none; padding: 0; margin: 0 0 10px 0;">
         <li style="background-color: #444444; color: #eeeeee; font-weight: bold; display: inline; padding: 3px 6px 3px 6px; margin-right: 12px;">Y%Y</li>
@@ -21,10 +37,11 @@ DAILY_TAG = """<div>
 
 
 def get_note_token():
-    """Return dev_token for Evernote."""
-    lines = [line.rstrip('\n') for line in open('pass.txt')]
-    dev_token = lines[2]
-    return dev_token
+    """Return dev_token for Evernote. Credentials file is only read once per process."""
+    if 'token' not in _CLIENT:
+        lines = [line.rstrip('\n') for line in open('pass.txt')]
+        _CLIENT['token'] = lines[2]
+    return _CLIENT['token']
 
 
 def headify(word):
@@ -38,27 +55,29 @@ def headify(word):
     return heading
 
 
-def create_resources(file_list=None):
+def create_resources(images=None):
     """
-    Transform image to Evernote resource object.
-    :param file_list: a list of image file path.
+    Transform images to Evernote resource objects.
+    :param images: a list of ChartImage from plot functions, with md5 already computed,
+        or image file paths to read and hash.
     :return: a list of resource objects.
     """
     resources = []
-    if file_list:
-        for file_name in file_list:
-            image = open(file_name, 'rb').read()
-            md5 = hashlib.md5()
-            md5.update(image)
-            hash_value = md5.digest()
+    if images:
+        for image in images:
+            if isinstance(image, basestring):
+                body = open(image, 'rb').read()
+                hash_value, mime = hashlib.md5(body).digest(), 'image/png'
+            else:
+                body, hash_value, mime = image.data, image.md5, image.mime
 
             data = ever_types.Data()
-            data.size = len(image)
+            data.size = len(body)
             data.bodyHash = hash_value
-            data.body = image
+            data.body = body
 
             resource = ever_types.Resource()
-            resource.mime = 'image/png'
+            resource.mime = mime
             resource.data = data
             resources.append(resource)
     return resources
@@ -81,29 +100,125 @@ def resoursify(resource, width=None):
     return resource
 
 
-def connect_note():
-    """Connect to Evernote API."""
-    dev_token = get_note_token()
-    client = EvernoteClient(token=dev_token, sandbox=False)
-    note_store = client.get_note_store()
-    return dev_token, note_store
+class NoteClient(object):
+    """
+    Client for Evernote API. One note store connection serves all searches and creates, the notebook name to
+    guid map is kept for NOTEBOOK_TTL seconds, and notebooks of reports are resolved once and then kept
+    in a local file.
+    """
 
+    def __init__(self, auth_token=None, note_store=None, notebooks_file=NOTEBOOKS_FILE, known=KNOWN_NOTEBOOKS,
+                 names=NOTEBOOK_NAMES):
+        """
+        :param auth_token: development token, default from get_note_token().
+        :param note_store: note store object, default connect to Evernote, MemoryNoteStore to try without it.
+        :param notebooks_file: (str) json file to keep guids of report notebooks, None to not keep.
+        :param known: (dict) role: guid of the notebook to use while it exists.
+        :param names: (dict) role: name to find the notebook by when its known guid is gone.
+        """
+        self.known = known
+        self.names = names
+        self.auth_token = auth_token if auth_token is not None else get_note_token()
+        if note_store is None:
+            note_store = EvernoteClient(token=self.auth_token, sandbox=False).get_note_store()
+        self.note_store = note_store
+        self.notebooks_file = notebooks_file
+        self.resolved = {}
+        if notebooks_file and os.path.exists(notebooks_file):
+            with open(notebooks_file) as f:
+                self.resolved = json.load(f)
+        self._notebooks = {}
 
-def create_note(auth_token, note_store, level, note_title,
-                resources=None, headings=None, widths=None,
-                tag=None, intro=None, ending=None):
+    def notebooks(self, refresh=False):
+        """
+        Map notebook names to guids, listed again after NOTEBOOK_TTL seconds.
+        :param refresh: (bool) list notebooks now.
+        :return: (dict) name: guid
+        """
+        if refresh or time.time() - self._notebooks.get('time', 0) > NOTEBOOK_TTL:
+            notebooks = self.note_store.listNotebooks(self.auth_token)
+            self._notebooks = {'time': time.time(), 'names': dict((x.name, x.guid) for x in notebooks)}
+        return self._notebooks['names']
+
+    def notebook_guid(self, role):
+        """
+        Resolve the notebook of a role, once, the guid is kept in notebooks_file.
+        Its guid in `known` is used while that notebook exists, another notebook of the same name can not take
+        its place. Otherwise the notebook is found by its name in `names`.
+        Delete the file after renaming or recreating a notebook.
+        :param role: (str) a key of REPORT_NOTEBOOKS values, 'diary' or 'review'.
+        :return: (str) guid
+        """
+        if role not in self.resolved:
+            notebooks = self.notebooks()
+            name = self.names.get(role)
+            if self.known.get(role) in notebooks.values():
+                self.resolved[role] = self.known[role]
+            elif name in notebooks:
+                print "Notebook of {0} reports not found by guid, using {1}.".format(role, name)
+                self.resolved[role] = notebooks[name]
+            else:
+                raise ValueError("Notebook {0} not found in: {1}.".format(name, ", ".join(sorted(notebooks))))
+            if self.notebooks_file:
+                with open(self.notebooks_file, 'w') as f:
+                    json.dump(self.resolved, f)
+        return self.resolved[role]
+
+    def report_notebook(self, level):
+        """
+        Return guid of the notebook for reports of a level.
+        :param level: (int) time frame number.
+        """
+        return self.notebook_guid(REPORT_NOTEBOOKS[level])
+
+    def find_notes(self, keywords, max_notes=100):
+        """
+        Search notes by keyword, newest first.
+        :param keywords: (str) keyword for search.
+        :param max_notes: (int) number of notes to return at most.
+        :return: (list) note metadata with title.
+        """
+        from evernote.edam.notestore.ttypes import NoteFilter, NotesMetadataResultSpec
+        search = NoteFilter()
+        search.words = keywords
+        search.ascending = False
+
+        spec = NotesMetadataResultSpec()
+        spec.includeTitle = True
+        return self.note_store.findNotesMetadata(self.auth_token, search, 0, max_notes, spec).notes
+
+
+def get_note_client():
+    """Return the client shared by the whole process, connected on first use."""
+    if 'client' not in _CLIENT:
+        _CLIENT['client'] = NoteClient()
+    return _CLIENT['client']
+
+
+def store_client(auth_token, note_store):
     """
-    Create note in Evernote.
+    Return the shared client if it holds this note store, otherwise wrap the note store in a new client.
     :param auth_token: development token.
     :param note_store: note store object.
-    :param level: (int) time frame number.
-    :param note_title: (str) title for note.
-    :param resources: (list) resources (images) add into note.
-    :param headings: (list) headers for images.
-    :param widths: (list) width of image.
-    :param tag: (str) a div contain list of tags for future search.
-    :param intro: (str) Some text add before all images.
-    :param ending: (str) Other title add after all images.
+    :return: NoteClient
+    """
+    client = _CLIENT.get('client')
+    if client is None or client.note_store is not note_store:
+        client = NoteClient(auth_token, note_store)
+    return client
+
+
+def connect_note():
+    """Connect to Evernote API, once per process, see get_note_client()."""
+    client = get_note_client()
+    return client.auth_token, client.note_store
+
+
+def build_note(level, note_title, resources=None, headings=None, widths=None,
+               tag=None, intro=None, ending=None, notebook_guid=None):
+    """
+    Build a note object of a report, without sending it, see create_note().
+    :param notebook_guid: (str) notebook to put the note in, see NoteClient.report_notebook().
     :return: note.
     """
     # Create note object
@@ -119,28 +234,216 @@ def create_note(auth_token, note_store, level, note_title,
     if intro is not None:
         note_body = note_body + intro + '<br /><br />'
     if resources:
-        # Add Resource objects to note body
-        our_note.resources = resources
+        # Add Resource objects to note body, tables are content themselves
+        our_note.resources = [x for x in resources if not isinstance(x, basestring)]
         for resource, heading, width in zip(resources, headings, widths):
             heading = headify(heading)
             note_body += heading
-            resource = resoursify(resource, width)
-            note_body += resource
+            if isinstance(resource, basestring):
+                note_body += resource + '<br />'
+            else:
+                note_body += resoursify(resource, width)
     if ending is None:
         ending = "Have a nice {0}!".format(LEVEL2STR[level][:-1])
     note_body += headify(ending)
     note_body += "<br /></en-note>"
 
     our_note.content = note_body
-    if level == 0:
-        our_note.notebookGuid = DIARY
-    else:
-        our_note.notebookGuid = REVIEW
+    our_note.notebookGuid = notebook_guid
+    return our_note
 
+
+def create_note(auth_token, note_store, level, note_title,
+                resources=None, headings=None, widths=None,
+                tag=None, intro=None, ending=None):
+    """
+    Create note in Evernote.
+    :param auth_token: development token.
+    :param note_store: note store object.
+    :param level: (int) time frame number.
+    :param note_title: (str) title for note.
+    :param resources: (list) resources (images) or ENML strings (tables) add into note, one for each heading.
+    :param headings: (list) headers for images and tables.
+    :param widths: (list) width of image, ignored for tables.
+    :param tag: (str) a div contain list of tags for future search.
+    :param intro: (str) Some text add before all images.
+    :param ending: (str) Other title add after all images.
+    :return: note.
+    """
+    notebook_guid = store_client(auth_token, note_store).report_notebook(level)
+    our_note = build_note(level, note_title, resources, headings, widths, tag, intro, ending, notebook_guid)
     note = note_store.createNote(auth_token, our_note)
     return note
 
 
+class NotePublisher(object):
+    """
+    Publish report notes idempotently. A local index keeps the note guid of each (level, period)
+    and the guid of each resource by md5, so publishing a period again updates its note instead of creating
+    a duplicate. Resources already in the note are referred to by guid and their bytes are not sent again,
+    and a note whose content has not changed at all is not sent, unless it was deleted or edited on Evernote.
+    """
+
+    def __init__(self, client=None, index_file=NOTE_INDEX_FILE):
+        """
+        :param client: NoteClient, default get_note_client().
+        :param index_file: (str) json file to keep the index, None to only keep it in memory.
+        """
+        self.client = client if client is not None else get_note_client()
+        self.auth_token = self.client.auth_token
+        self.note_store = self.client.note_store
+        self.index_file = index_file
+        self.index = {}
+        if index_file and os.path.exists(index_file):
+            with open(index_file) as f:
+                self.index = json.load(f)
+        self.stats = {'created': 0, 'updated': 0, 'unchanged': 0, 'sent': 0, 'kept': 0}
+
+    def publish(self, level, period, note_title, resources=None, headings=None, widths=None,
+                tag=None, intro=None, ending=None):
+        """
+        Create or update the note of a period, arguments as create_note().
+        :param level: (int) time frame number.
+        :param period: (str) date string of the period, e.g. '20151225' or '2015W52'.
+        :return: note, None when it has not changed since last published.
+        """
+        key = '{0}/{1}'.format(level, period)
+        our_note = build_note(level, note_title, resources, headings, widths, tag, intro, ending,
+                              self.client.report_notebook(level))
+        content_md5 = hashlib.md5(our_note.title + our_note.content).hexdigest()
+        entry = self.index.get(key)
+        if entry is not None and entry['content'] == content_md5:
+            remote = self.published_note(entry['guid'])
+            if remote is None:
+                # deleted on Evernote, publish it again
+                entry = None
+            elif remote.title == our_note.title and remote.contentHash == hashlib.md5(our_note.content).digest():
+                self.stats['unchanged'] += 1
+                return None
+        note = None
+        if entry is not None:
+            note = self.update(our_note, entry)
+        if note is None:
+            note = self.note_store.createNote(self.auth_token, our_note)
+            self.stats['created'] += 1
+            self.stats['sent'] += len(our_note.resources or [])
+        self.index[key] = {'guid': note.guid, 'content': content_md5,
+                           'resources': dict((binascii.hexlify(x.data.bodyHash), x.guid)
+                                             for x in note.resources or [])}
+        self.save()
+        return note
+
+    def published_note(self, guid):
+        """
+        Look up a published note without its content or resources.
+        :param guid: (str) note guid from the index.
+        :return: note, None when it is gone from Evernote or in its trash.
+        """
+        try:
+            note = self.note_store.getNote(self.auth_token, guid, False, False, False, False)
+        except EDAMNotFoundException:
+            return None
+        return note if note.active is not False else None
+
+    def update(self, our_note, entry):
+        """
+        Update a published note, sending only resources it does not have yet.
+        A note in the trash of Evernote is restored, so the new report is seen.
+        :param our_note: note from build_note().
+        :param entry: (dict) index entry of the note.
+        :return: note, None when the note is gone from Evernote.
+        """
+        resources = []
+        for resource in our_note.resources or []:
+            guid = entry['resources'].get(binascii.hexlify(resource.data.bodyHash))
+            if guid is not None:
+                # Evernote keeps the resource of this guid, only its hash is needed to match the content
+                data = ever_types.Data(bodyHash=resource.data.bodyHash, size=resource.data.size)
+                resource = ever_types.Resource(guid=guid, noteGuid=entry['guid'], mime=resource.mime, data=data)
+            resources.append(resource)
+        update = ever_types.Note(guid=entry['guid'], title=our_note.title, content=our_note.content,
+                                 notebookGuid=our_note.notebookGuid, resources=resources, active=True)
+        try:
+            note = self.note_store.updateNote(self.auth_token, update)
+        except EDAMNotFoundException:
+            return None
+        kept = sum(1 for x in resources if x.guid is not None)
+        self.stats['updated'] += 1
+        self.stats['kept'] += kept
+        self.stats['sent'] += len(resources) - kept
+        return note
+
+    def save(self):
+        """Write the index to its file."""
+        if self.index_file:
+            with open(self.index_file, 'w') as f:
+                json.dump(self.index, f)
+
+
+class MemoryNoteStore(object):
+    """
+    In-memory stand-in for the Evernote note store, enough for NotePublisher.
+    Notes are kept in `notes` by guid, and `uploaded` counts bytes of resource bodies received.
+    """
+
+    def __init__(self):
+        self.notes = {}
+        self.uploaded = 0
+        self._next = 0
+        self.notebooks = [ever_types.Notebook(guid=self._guid(), name=x)
+                          for x in sorted(NOTEBOOK_NAMES.values())]
+
+    def _guid(self):
+        self._next += 1
+        return 'memory-{0}'.format(self._next)
+
+    def _store_resources(self, note, old=None):
+        old = dict((x.guid, x) for x in (old.resources or [])) if old is not None else {}
+        resources = []
+        for resource in note.resources or []:
+            if resource.guid is not None:
+                if resource.guid not in old:
+                    raise EDAMNotFoundException(identifier='Resource.guid', key=resource.guid)
+                resource = old[resource.guid]
+            else:
+                self.uploaded += len(resource.data.body)
+                data = ever_types.Data(bodyHash=resource.data.bodyHash, size=resource.data.size,
+                                       body=resource.data.body)
+                resource = ever_types.Resource(guid=self._guid(), noteGuid=note.guid, mime=resource.mime, data=data)
+            resources.append(resource)
+        note.resources = resources
+
+    def listNotebooks(self, auth_token):
+        return list(self.notebooks)
+
+    def createNote(self, auth_token, note):
+        note = copy.deepcopy(note)
+        note.guid = self._guid()
+        note.active, note.contentHash = True, hashlib.md5(note.content).digest()
+        self._store_resources(note)
+        self.notes[note.guid] = note
+        return note
+
+    def updateNote(self, auth_token, note):
+        if note.guid not in self.notes:
+            raise EDAMNotFoundException(identifier='Note.guid', key=note.guid)
+        note = copy.deepcopy(note)
+        # like Evernote, a note stays in the trash unless active is set
+        note.active = self.notes[note.guid].active if note.active is None else note.active
+        note.contentHash = hashlib.md5(note.content).digest()
+        self._store_resources(note, self.notes[note.guid])
+        self.notes[note.guid] = note
+        return note
+
+    def getNote(self, auth_token, guid, with_content, with_resources_data, with_recognition, with_alternate):
+        if guid not in self.notes:
+            raise EDAMNotFoundException(identifier='Note.guid', key=guid)
+        return self.notes[guid]
+
+    def deleteNote(self, auth_token, guid):
+        del self.notes[guid]
+
+
 def find_notebook_guid(auth_token, note_store, notebook):
     """
     Find guid for notebook in Evernote.
@@ -149,13 +452,8 @@ def find_notebook_guid(auth_token, note_store, notebook):
     :param notebook: (str) notebook name.
     :return: (list) all guid satisfied with search.
     """
-    dev_token, note_store = connect_note()
-    notebooks = note_store.listNotebooks()
-    guids = []
-    for n in notebooks:
-        if n.name == notebook:
-            guids.append(n.guid)
-    return guids
+    notebooks = store_client(auth_token, note_store).notebooks()
+    return [notebooks[notebook]] if notebook in notebooks else []
 
 
 def find_note(keywords):
@@ -164,17 +462,9 @@ def find_note(keywords):
     :param keywords: (str) keyword for search.
     :return: (str) first result content.
     """
-    from evernote.edam.notestore.ttypes import NoteFilter, NotesMetadataResultSpec
-    dev_token, note_store = connect_note()
-    search = NoteFilter()
-    search.words = keywords
-    search.ascending = False
-
-    spec = NotesMetadataResultSpec()
-    spec.includeTitle = True
-
-    our_note_list = note_store.findNotesMetadata(dev_token, search, 0, 100, spec)
-    note_content = note_store.getNoteContent(dev_token, our_note_list.notes[0].guid)
+    client = get_note_client()
+    notes = client.find_notes(keywords)
+    note_content = client.note_store.getNoteContent(client.auth_token, notes[0].guid)
     return note_content
 
 
@@ -194,12 +484,12 @@ def create_tag(tag_list):
     return result
 
 
-def date_tag(timestamp, level, tzinfo='US/Eastern'):
+def date_tag(timestamp, level, tzinfo=TZINFO):
     """
     Create tags element for notes.
     :param timestamp: unix start time of the date.
     :param level: (int) time frame number.
-    :param tzinfo: time zone.
+    :param tzinfo: time zone, default is TZINFO.
     :return: (str) html tags.
     """
     date_time = ts2datetime(timestamp, tzinfo)
@@ -1,13 +1,24 @@
+import hashlib
+import io
+import matplotlib
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import matplotlib.ticker as ticker
+import numpy as np
+from contextlib import contextmanager
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 from time_func import SEC_HOUR, SEC_DAY
-from db import connect_db
+from getdata import get_type_registry
 
 plt.ioff()
 PALETTE_12 = ["#CB5E1C", "#34A002", "#D63EC6", "#6FCECE",
               "#D09340", "#FF859B", "#F9E401", "#7F59CC",
               "#ED1F22", "#824D2C", "#2F589D", "#3C6034"]
+# idle figures of each chart layout kept for the next render, see chart_figure()
+_TEMPLATES = {}
+# counters of figures built and reused
+FIGURE_STATS = {'created': 0, 'reused': 0}
 
 
 def bar_width(level):
@@ -23,13 +34,136 @@ def bar_width(level):
 
 def get_palette():
     """Return the hexadecimal color code in a dictionary."""
-    cnx, cursor = connect_db()
-    query = """select name, color from types"""
-    cursor.execute(query)
-    color = cursor.fetchall()
-    cnx.close()
-    color = {x[0]: '#' + format(x[1], 'x') for x in color}
-    return color
+    return get_type_registry().palette()
+
+
+@contextmanager
+def chart_figure(name, nrows=1, ncols=1, figsize=None, reuse=True):
+    """
+    Figure for one chart, drawn on its own Agg canvas outside pyplot, so pyplot never holds on to it.
+    With reuse, the figure and its axes are kept when the block exits, cleared and handed to the next
+    render of the same chart and layout instead of being built again. Otherwise, or when the block raises,
+    the figure is cleared and dropped. Either way nothing accumulates across renders.
+    Usage:
+        with chart_figure('group_pie', 1, 2, figsize=(14, 7)) as (fig, axs):
+            ...
+            return save_chart(fig, dpi=200)
+    :param name: (str) chart name, only figures of the same name are reused.
+    :param nrows: (int) rows of axes.
+    :param ncols: (int) columns of axes.
+    :param figsize: (tuple) width, height in inches, default from rcParams.
+    :param reuse: (bool) keep the figure for the next render.
+    :return: (fig, axes), axes in the same shape as plt.subplots().
+    """
+    key = (name, nrows, ncols, figsize)
+    # taken out while in use, so nested renders of one chart get separate figures
+    template = _TEMPLATES.pop(key, None) if reuse else None
+    if template is None:
+        fig = Figure(figsize=figsize)
+        FigureCanvasAgg(fig)
+        axes = fig.subplots(nrows, ncols)
+        FIGURE_STATS['created'] += 1
+    else:
+        fig, axes = template
+        FIGURE_STATS['reused'] += 1
+    try:
+        yield fig, axes
+    except Exception:
+        fig.clf()
+        raise
+    if reuse:
+        reset_figure(fig, axes)
+        _TEMPLATES[key] = (fig, axes)
+    else:
+        fig.clf()
+
+
+def reset_figure(fig, axes):
+    """
+    Bring a figure from chart_figure() back to the state it was built in, keeping its axes.
+    :param fig: Figure
+    :param axes: axes of the figure as built.
+    """
+    axes = list(np.ravel(axes))
+    for ax in fig.axes:
+        if ax not in axes:
+            fig.delaxes(ax)
+    for ax in axes:
+        ax.cla()
+        ax.set_axis_on()
+        ax.set_aspect('auto')
+    fig.texts, fig.legends, fig.lines, fig.patches, fig.artists, fig.images = [], [], [], [], [], []
+    fig._suptitle = None
+    fig.set_tight_layout(None)
+    rc = matplotlib.rcParams
+    fig.subplots_adjust(**{x: rc['figure.subplot.' + x] for x in ['left', 'bottom', 'right', 'top',
+                                                                   'wspace', 'hspace']})
+
+
+def clear_templates():
+    """Drop all figures kept for reuse, e.g. after changing style."""
+    for fig, axes in _TEMPLATES.values():
+        fig.clf()
+    _TEMPLATES.clear()
+
+
+class ChartImage(object):
+    """
+    A chart encoded in memory and the md5 digest of its bytes, computed while encoding, see save_chart().
+    It pickles to come back from a render worker, and note.create_resources() takes it in place of an image file.
+    """
+
+    def __init__(self, data, md5, path=None, mime='image/png'):
+        """
+        :param data: (str) encoded bytes.
+        :param md5: (str) md5 digest of data.
+        :param path: (str) file the image was also written to, None if only in memory.
+        :param mime: (str) mime type of data.
+        """
+        self.data = data
+        self.md5 = md5
+        self.path = path
+        self.mime = mime
+
+    @property
+    def size(self):
+        """Number of bytes."""
+        return len(self.data)
+
+    def view(self):
+        """Return a memoryview of the bytes, without copying."""
+        return memoryview(self.data)
+
+
+class _HashingBuffer(io.BytesIO):
+    """BytesIO that feeds every chunk written into md5, so the image is never read again to hash it."""
+
+    def __init__(self):
+        io.BytesIO.__init__(self)
+        self.md5 = hashlib.md5()
+
+    def write(self, data):
+        self.md5.update(data)
+        return io.BytesIO.write(self, data)
+
+
+def save_chart(fig, path=None, **kwargs):
+    """
+    Encode a figure into png in memory, and optionally write it to a file too.
+    Usage:
+        image = save_chart(fig, bbox_inches='tight', dpi=200)
+    :param fig: Figure
+    :param path: (str) image file to write, default only keep in memory.
+    :param kwargs: arguments of Figure.savefig(), e.g. dpi.
+    :return: ChartImage
+    """
+    buf = _HashingBuffer()
+    fig.savefig(buf, format='png', **kwargs)
+    image = ChartImage(buf.getvalue(), buf.md5.digest(), path)
+    if path is not None:
+        with open(path, 'wb') as f:
+            f.write(image.data)
+    return image
 
 
 def date_formatter(ax_value, pos):
@@ -0,0 +1,80 @@
+"""This module renders report charts in parallel, one worker process per chart."""
+import os
+import time
+from multiprocessing import Pool, cpu_count
+
+# a report has at most five charts, more processes than cores only adds overhead
+RENDER_WORKERS = min(5, cpu_count())
+# charts between two progress lines, see render_charts()
+PROGRESS_EVERY = 20
+
+
+def init_worker():
+    """Draw with Agg in workers, no window or GUI event loop is needed to save images."""
+    import matplotlib.pyplot as plt
+    plt.switch_backend('Agg')
+
+
+def render_job(job):
+    """
+    Draw one chart and encode it.
+    :param job: (function, args, path), a plot function of plot_func, its arguments
+        and the image file it also writes, passed as its `path` argument, None to only keep it in memory.
+    :return: ChartImage, (float) seconds spent.
+    """
+    import matplotlib.pyplot as plt
+    func, args, path = job
+    begin = time.time()
+    # an image left by an earlier run must not pass for this one
+    if path is not None and os.path.exists(path):
+        os.remove(path)
+    image = func(*args, path=path)
+    # workers live on to draw the next chart, so free figures right away
+    plt.close('all')
+    return image, time.time() - begin
+
+
+def render_charts(jobs, workers=RENDER_WORKERS, progress=False):
+    """
+    Render independent charts concurrently. Each worker gets only the prepared data and TypeRegistry
+    in the arguments of its job, not database connections, and sends back the encoded image.
+    Give the slowest job first, so the wall time is close to the slowest chart.
+    Usage:
+        images = render_charts([(type_bar_grid_plot, (agg_data, 1, types), None),
+                                (group_pie_plot, (cut_data, types), 'img/group_pie.png')])
+    :param jobs: (list) tuples of (function, args, path), see render_job().
+    :param workers: (int) number of worker processes, 1 to render in this process.
+    :param progress: (bool) print charts done and throughput every PROGRESS_EVERY charts.
+    :return: (list) ChartImage in the order of jobs.
+    """
+    begin = time.time()
+    workers = min(workers, len(jobs))
+    pool = None
+    if workers <= 1:
+        rendered = (render_job(job) for job in jobs)
+    else:
+        pool = Pool(workers, initializer=init_worker)
+        rendered = pool.imap(render_job, jobs, chunksize=1)
+    results = []
+    try:
+        for result in rendered:
+            results.append(result)
+            if progress and (len(results) % PROGRESS_EVERY == 0 or len(results) == len(jobs)):
+                elapsed = time.time() - begin
+                print "Rendered {0}/{1} charts, {2:.2f} charts/sec.".format(len(results), len(jobs),
+                                                                           len(results) / elapsed)
+    except Exception:
+        # no point drawing the rest once a chart failed
+        if pool is not None:
+            pool.terminate()
+        raise
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    for image, elapsed in results:
+        if image.path is not None and not os.path.exists(image.path):
+            raise IOError("Chart {0} was not saved.".format(image.path))
+    print "Rendered {0} charts in {1:.2f}s, slowest {2:.2f}s.".format(
+        len(results), time.time() - begin, max([x[1] for x in results] or [0]))
+    return [x[0] for x in results]
@@ -0,0 +1,252 @@
+"""This module generates daily, weekly and monthly reports in Evernote."""
+import os
+import time
+from db import *
+from note import *
+from plot_func import *
+from render import render_charts, RENDER_WORKERS
+from table_func import *
+
+# previous days a daily report compares sleep with
+SLEEP_DAYS = 7
+# charts of backfilled reports are kept apart, one folder per date string
+BACKFILL_FOLDER = 'img/backfill'
+# trends of weekly and monthly reports only chart Sum, which daily rollup answers exactly, see validate_rollup().
+# Raw intervals are used for a database without rollup yet.
+TRENDS_FROM_ROLLUP = True
+
+
+def chart_path(folder, name):
+    """
+    Path of a chart image in folder.
+    :param folder: (str) directory, None for charts only kept in memory.
+    :param name: (str) file name.
+    :return: (str) path, None without folder.
+    """
+    return os.path.join(folder, name) if folder is not None else None
+
+
+def daily_content(session, sleep_data, folder=None):
+    """
+    Prepare charts and layout of a daily report from entries in memory, see daily_report().
+    :param session: ReportSession of the day.
+    :param sleep_data: sleep summary of the day from sleep_compare().
+    :param folder: (str) directory to also write charts in, default only keep them in memory.
+    :return: (dict) period, title, tags, intro, jobs for render_charts(), sections of the note in order of
+        headings, each an index into the rendered images or an ENML table, headings and widths.
+    """
+    start = session.start
+    last_cut = session.cut_level(0)
+    task_data = get_task_table(last_cut)
+    jobs = [(group_pie_plot, (last_cut, session.types), chart_path(folder, 'group_pie.png'))]
+    sections = [sleep_table_enml(sleep_data), 0]
+    headings = ['1. Good Morning!', '2. What\'s up?']
+    widths = [None, None]
+    # in case of early date with zero task
+    if task_data.shape[0] != 0:
+        sections.append(task_table_enml(task_data, session.types))
+        headings.append('3. How are things going?')
+        widths.append(None)
+    day = ts2str_level(start, 0)
+    return {'period': day, 'title': day, 'tags': date_tag(start, 0), 'intro': day_info(day),
+            'jobs': jobs, 'sections': sections, 'headings': headings, 'widths': widths}
+
+
+def period_content(session, level, folder=None):
+    """
+    Prepare charts and layout of a weekly or monthly report from entries in memory,
+    see weekly_report() and monthly_report().
+    :param session: ReportSession of the week or month.
+    :param level: (int) time frame number, 1 or 2.
+    :param folder: (str) directory to also write charts in, default only keep them in memory.
+    :return: (dict) same as daily_content().
+    """
+    start, end = session.start, session.end
+    if level == 1:
+        start_date = ts2datetime(start).strftime('%b %d')
+        end_date = ts2datetime(end-1).strftime('%b %d')
+        title = ts2datetime(start).strftime("%Y Week%V ({0} - {1})".format(start_date, end_date))
+        headings = ['1. Group Overview', '2. Type Detail', '3. Group Trends', '4. Type Trends', '5. Sleep Trends']
+    else:
+        start_week = ts2datetime(start).strftime('%V')
+        end_week = ts2datetime(end-1).strftime('%V')
+        title = ts2datetime(start).strftime("%Y Month%m (W{0} - W{1})".format(start_week, end_week))
+        headings = ['1. Group Overview', '3. Type Detail', '2. Group Trends', '4. Type Trends', '5. Sleep Trends']
+    # trends of a week are by day, of a month by week
+    cut_data = session.cut()
+    type_data = get_type_detail(cut_data, session)
+    agg_data_group = agg_level(start, end, 'group', level - 1, session=session, rollup=TRENDS_FROM_ROLLUP)
+    agg_data_type = agg_level(start, end, 'type', level - 1, session=session, rollup=TRENDS_FROM_ROLLUP)
+    sleep_data = session.sleep()
+    # the 3x3 grid is the slowest, start it first
+    jobs = [(type_bar_grid_plot, (agg_data_type, level - 1, session.types),
+             chart_path(folder, 'type_bar_grid.png')),
+            (group_pie_plot, (cut_data, session.types), chart_path(folder, 'group_pie.png')),
+            (group_barh_plot, (agg_data_group, level - 1, session.types), chart_path(folder, 'group_bar.png')),
+            (sleep_plot, (sleep_data,), chart_path(folder, 'sleep_plot.png'))]
+    return {'period': ts2str_level(start, level), 'title': title, 'tags': date_tag(start, level), 'intro': None,
+            'jobs': jobs,
+            'sections': [1, type_table_enml(type_data, session.types), 2, 0, 3], 'headings': headings,
+            'widths': [None] * 5}
+
+
+def publish_report(level, report, images, publisher=None):
+    """
+    Create the note of a prepared report in Evernote, or update it if the period was published before.
+    :param level: (int) time frame number.
+    :param report: (dict) from daily_content() or period_content().
+    :param images: (list) ChartImage rendered from the jobs of report, in the same order.
+    :param publisher: NotePublisher, default publish with the client of this process.
+    :return: note, None when it has not changed.
+    """
+    if publisher is None:
+        publisher = NotePublisher()
+    resources = create_resources(images)
+    sections = [resources[x] if isinstance(x, int) else x for x in report['sections']]
+    return publisher.publish(level, report['period'], report['title'], sections, report['headings'],
+                             report['widths'], report['tags'], report['intro'])
+
+
+def daily_report(date=None):
+    """
+    Generate daily report in Evernote.
+    Report content: 1.Date info, 2.Sleep table, 3.Group pie chart, 4.Task table.
+    :param date: A string of date in the format 'YYYYMMDD', default None for yesterday.
+    """
+    mysql_switch(1)
+    if date:
+        start, end = str2level_range(date, 0)
+    else:
+        # TODO Replace human_qr with str2level_range
+        start, end = human_qr('last 1 days')
+    with db_session() as stats:
+        sleep_data = sleep_compare(date, SLEEP_DAYS)
+        report = daily_content(ReportSession(start, end), sleep_data)
+    print "Database connections: {0} opened, {1} reused.".format(stats['opened'], stats['reused'])
+    publish_report(0, report, render_charts(report['jobs']))
+    mysql_switch(0)
+    print "Generate daily report for {0}!".format(report['title'])
+
+
+def weekly_report(week=None):
+    """
+    Generate weekly report in Evernote.
+    Report content: 1.Group pie chart, 2.Type table, 3.Group stacked bar chart, 4. Type grid chart, 5. Sleep plot.
+    :param week: A string of week number in the format 'YYYYWww', e.g '2015W07'. Default None for last week.
+    """
+    mysql_switch(1)
+    if week:
+        start, end = str2level_range(week, 1)
+    else:
+        now = arrow.get(datetime.now(), TZINFO)
+        start, end = str2level_range(now.strftime('%YW%V'), 1)
+    with db_session() as stats:
+        report = period_content(ReportSession(start, end), 1)
+    print "Database connections: {0} opened, {1} reused.".format(stats['opened'], stats['reused'])
+    publish_report(1, report, render_charts(report['jobs']))
+    mysql_switch(0)
+    print "Generate weekly report for {0}!".format(report['title'])
+
+
+def monthly_report(month=None):
+    """
+    Generate monthly report in Evernote.
+    Report content: 1.Group pie chart, 2.Type table, 3.Group stacked bar chart, 4. Type grid chart, 5. Sleep plot.
+    :param month: A string of month number in the format 'YYYYMmm', e.g '2015M02'. Default None for last month.
+    """
+    mysql_switch(1)
+    if month:
+        start, end = str2level_range(month, 2)
+    else:
+        now = arrow.get(datetime.now(), TZINFO)
+        start, end = str2level_range(now.strftime('%YM%m'), 2)
+    with db_session() as stats:
+        report = period_content(ReportSession(start, end), 2)
+    print "Database connections: {0} opened, {1} reused.".format(stats['opened'], stats['reused'])
+    publish_report(2, report, render_charts(report['jobs']))
+    mysql_switch(0)
+    print "Generate monthly report for {0}!".format(report['title'])
+
+
+def backfill(first, last, level=0, publish=True, workers=RENDER_WORKERS, folder=BACKFILL_FOLDER):
+    """
+    Generate the reports of every day, week or month from first to last in one process.
+    Entries of the whole span, and daily rollup rows for trends, are loaded once, each report slices its period
+    from memory, then all charts are rendered by one worker pool.
+    Usage:
+        backfill('20150101', '20151231')
+        backfill('2015W01', '2015W52', 1, publish=False)
+    :param first: A string of the first date/week/month, see str2level_range().
+    :param last: A string of the last date/week/month, included.
+    :param level: An integer for different time levels. 0: daily (default), 1: weekly, 2: monthly.
+    :param publish: (bool) create notes in Evernote, False to only render charts.
+    :param workers: (int) number of render processes.
+    :param folder: (str) directory to also write charts in, one sub directory per report, None to only keep
+        them in memory.
+    :return: (list) reports prepared, see daily_content().
+    """
+    mysql_switch(1)
+    begin = time.time()
+    keys = level_keys(first, last, level)
+    ranges = [str2level_range(key, level) for key in keys]
+    span_start, span_end = ranges[0][0], ranges[-1][1]
+    if level == 0:
+        # a daily report compares sleep with the days before
+        span_start -= int((SLEEP_DAYS + 1) * SEC_DAY)
+    with db_session() as stats:
+        span = ReportSession(span_start, span_end)
+        if level != 0 and TRENDS_FROM_ROLLUP:
+            span.rollup()
+    print "Loaded {0} entries of {1} {2}, database connections: {3} opened.".format(
+        span.data.shape[0], len(keys), LEVEL2STR[level], stats['opened'])
+    loaded = time.time()
+
+    reports, jobs = [], []
+    for key, (start, end) in zip(keys, ranges):
+        session = span.period(start, end)
+        if session.data.shape[0] == 0:
+            print "No entries for {0}, skipped.".format(key)
+            continue
+        report_folder = os.path.join(folder, key) if folder is not None else None
+        if report_folder is not None and not os.path.exists(report_folder):
+            os.makedirs(report_folder)
+        if level == 0:
+            report = daily_content(session, sleep_compare(key, SLEEP_DAYS, session=span), report_folder)
+        else:
+            report = period_content(session, level, report_folder)
+        # position of its charts in the rendered images
+        report['first'] = len(jobs)
+        jobs.extend(report['jobs'])
+        reports.append(report)
+    prepared = time.time()
+
+    images = render_charts(jobs, workers, progress=True) if jobs else []
+    rendered = time.time()
+
+    if publish and reports:
+        publisher = NotePublisher()
+        for report in reports:
+            publish_report(level, report, images[report['first']:report['first'] + len(report['jobs'])], publisher)
+        print "Notes: {created} created, {updated} updated, {unchanged} unchanged. " \
+              "Images: {sent} sent, {kept} kept.".format(**publisher.stats)
+    mysql_switch(0)
+    finished = time.time()
+    print ("Backfilled {0} reports in {1:.1f}s, {2:.2f} reports/sec. "
+           "Load {3:.1f}s, prepare {4:.1f}s, render {5:.1f}s, publish {6:.1f}s.").format(
+        len(reports), finished - begin, len(reports) / max(finished - begin, 1e-6), loaded - begin,
+        prepared - loaded, rendered - prepared, finished - rendered)
+    return reports
+
+
+def gen_report(level=0, date=None):
+    """
+    Report wrapper function.
+    :param level: An integer for different time levels. 0: daily (default), 1: weekly, 2: monthly.
+    :param date: A string to specify date/week/month.
+    """
+    if level == 0:
+        daily_report(date)
+    elif level == 1:
+        weekly_report(date)
+    elif level == 2:
+        monthly_report(date)
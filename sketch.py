@@ -0,0 +1,156 @@
+"""This module defines mergeable summaries of durations, so statistics of days can be combined into longer periods."""
+import json
+import math
+
+# relative accuracy of QuantileSketch, a quantile is estimated within 1% of the true value
+SKETCH_ALPHA = 0.01
+
+
+class Moments(object):
+    """
+    Count, mean, sum of squared deviations (m2), min and max of values, updated one value at a time (Welford).
+    m2 of days in the rollup is merged into periods on whole columns by analysis.agg_level_rollup() (Chan et al.).
+    """
+
+    def __init__(self, n=0, mean=0., m2=0., low=None, high=None):
+        self.n = n
+        self.mean = mean
+        self.m2 = m2
+        self.low = low
+        self.high = high
+
+    @classmethod
+    def from_values(cls, values):
+        """
+        Summarize a list of values.
+        :param values: An iterable of numbers.
+        :return: Moments
+        """
+        moments = cls()
+        for value in values:
+            moments.add(value)
+        return moments
+
+    def add(self, value):
+        """Add one value."""
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / float(self.n)
+        self.m2 += delta * (value - self.mean)
+        self.low = value if self.low is None else min(self.low, value)
+        self.high = value if self.high is None else max(self.high, value)
+
+
+class QuantileSketch(object):
+    """
+    Log-bucket quantile sketch (DDSketch). A positive value x falls in bucket k = ceil(log(x) / log(gamma)),
+    gamma = (1 + alpha) / (1 - alpha), and a bucket is read back as 2 * gamma ** k / (gamma + 1).
+    Every quantile estimate is within relative error alpha of the true value: |estimate - x| <= alpha * x.
+    Zero and negative values are kept in a separate exact counter and read back as 0.
+    Two sketches merge by adding bucket counts, the bound holds after any number of merges.
+    Size grows with log(max / min) of the values, about 550 buckets for 1 second to 1 day at alpha 1%.
+    """
+
+    def __init__(self, alpha=SKETCH_ALPHA):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self.log_gamma = math.log(self.gamma)
+        self.zero = 0
+        self.bins = {}
+
+    @classmethod
+    def from_values(cls, values, alpha=SKETCH_ALPHA):
+        """
+        Summarize a list of values.
+        :param values: An iterable of numbers.
+        :param alpha: (float) relative accuracy.
+        :return: QuantileSketch
+        """
+        sketch = cls(alpha)
+        for value in values:
+            sketch.add(value)
+        return sketch
+
+    @property
+    def count(self):
+        """Number of values added."""
+        return self.zero + sum(self.bins.values())
+
+    def add(self, value, count=1):
+        """Add a value, `count` times."""
+        if value <= 0:
+            self.zero += count
+            return
+        key = int(math.ceil(math.log(value) / self.log_gamma))
+        self.bins[key] = self.bins.get(key, 0) + count
+
+    def merge(self, other):
+        """
+        Add all values summarized by another sketch of the same accuracy.
+        :param other: QuantileSketch
+        :return: self
+        """
+        if other.alpha != self.alpha:
+            raise ValueError("Cannot merge sketches of accuracy {0} and {1}.".format(self.alpha, other.alpha))
+        self.zero += other.zero
+        for key, count in other.bins.iteritems():
+            self.bins[key] = self.bins.get(key, 0) + count
+        return self
+
+    def value_at(self, rank):
+        """
+        Estimate the value of given rank.
+        :param rank: (int) 0 for the smallest value, count - 1 for the largest.
+        :return: (float)
+        """
+        if rank < self.zero:
+            return 0.
+        seen = self.zero
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        raise IndexError("Rank {0} out of {1} values.".format(rank, self.count))
+
+    def quantile(self, q):
+        """
+        Estimate a quantile, interpolated between the two nearest ranks like pandas and numpy.
+        :param q: (float) between 0 and 1, 0.5 for median.
+        :return: (float) NaN for an empty sketch.
+        """
+        count = self.count
+        if count == 0:
+            return float('nan')
+        position = q * (count - 1)
+        lower = int(math.floor(position))
+        value = self.value_at(lower)
+        if position > lower:
+            value += (self.value_at(lower + 1) - value) * (position - lower)
+        return value
+
+    def to_json(self):
+        """Return a compact json string to store, see from_json()."""
+        return json.dumps({'a': self.alpha, 'z': self.zero, 'b': sorted(self.bins.items())},
+                          separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, string):
+        """Load a sketch stored by to_json()."""
+        item = json.loads(string)
+        sketch = cls(item['a'])
+        sketch.zero = item['z']
+        sketch.bins = dict((key, count) for key, count in item['b'])
+        return sketch
+
+
+def merge_sketches(strings, alpha=SKETCH_ALPHA):
+    """
+    Merge stored sketches into one.
+    :param strings: An iterable of json strings from QuantileSketch.to_json().
+    :param alpha: (float) relative accuracy of the sketches.
+    :return: QuantileSketch
+    """
+    sketch = QuantileSketch(alpha)
+    for string in strings:
+        sketch.merge(QuantileSketch.from_json(string))
+    return sketch
@@ -0,0 +1,171 @@
+"""This module smooths evenly spaced series for line plots, without statsmodels."""
+import hashlib
+import time
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+
+# 'local' for windowed local regression, 'ewm' for exponentially weighted mean, 'lowess' for statsmodels
+SMOOTH_METHOD = 'local'
+# robustifying iterations of local regression, same as the default of lowess
+SMOOTH_ITERATIONS = 3
+# a window of equal weights this much narrower smooths about as much as the tricube weights of lowess
+EQUAL_WEIGHT_WIDTH = 0.7
+# smoothed series kept by hash of their input, see smooth_series()
+SMOOTH_CACHE_SIZE = 256
+_CACHE = OrderedDict()
+CACHE_STATS = {'hits': 0, 'misses': 0}
+
+
+def default_frac(n):
+    """Fraction of points in each window, 1 / sqrt(n) as plot_func has always used."""
+    return 1. / n ** 0.5 if n else 1.
+
+
+def window_size(n, frac):
+    """Number of points in each window, counted the same way as lowess, at least 2."""
+    return min(n, max(int(frac * n + 1e-10), 2))
+
+
+def local_regression(y, frac=None, iterations=SMOOTH_ITERATIONS):
+    """
+    Local linear regression over a sliding window of the nearest points, like lowess on x = 0, 1, ..., n - 1
+    with equal weights in a window EQUAL_WEIGHT_WIDTH as wide instead of tricube. Sums of every window come from
+    cumulative sums, so the cost is linear in the number of points, lowess is about quadratic.
+    Robustifying iterations give bisquare weights to points from their residuals, as lowess does.
+    :param y: (array) evenly spaced values.
+    :param frac: (float) fraction of points in each window, default 1 / sqrt(n).
+    :param iterations: (int) robustifying iterations after the first fit.
+    :return: (array) smoothed values.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n < 3:
+        return y.copy()
+    k = window_size(n, (default_frac(n) if frac is None else frac) * EQUAL_WEIGHT_WIDTH)
+    x = np.arange(n, dtype=float)
+    lower = np.clip(np.arange(n) - k // 2, 0, n - k)
+    upper = lower + k
+    weights = np.ones(n)
+    fitted = y
+    # residuals at rounding level mean the fit is exact
+    tolerance = 1e-10 * max(np.abs(y).max(), 1.)
+    for _ in range(iterations + 1):
+        sums = []
+        for values in (weights, weights * x, weights * y, weights * x * x, weights * x * y):
+            total = np.concatenate(([0.], np.cumsum(values)))
+            sums.append(total[upper] - total[lower])
+        s0, sx, sy, sxx, sxy = sums
+        # a window of only zero weights keeps its last fit
+        empty = s0 <= 0
+        s0 = np.where(empty, 1., s0)
+        mean_x, mean_y = sx / s0, sy / s0
+        var = sxx / s0 - mean_x ** 2
+        cov = sxy / s0 - mean_x * mean_y
+        slope = np.where(var > 1e-12, cov / np.where(var > 1e-12, var, 1.), 0.)
+        fitted = np.where(empty, fitted, mean_y + slope * (x - mean_x))
+        residuals = np.abs(y - fitted)
+        scale = 6 * np.median(residuals)
+        if scale <= tolerance:
+            break
+        weights = np.clip(1 - (residuals / scale) ** 2, 0, 1) ** 2
+    return fitted
+
+
+def ewm_smooth(y, frac=None):
+    """
+    Exponentially weighted mean run forward and backward and averaged, so peaks are not shifted in time.
+    The span is the number of points in a window of lowess.
+    :param y: (array) evenly spaced values.
+    :param frac: (float) fraction of points in the span, default 1 / sqrt(n).
+    :return: (array) smoothed values.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n < 3:
+        return y.copy()
+    span = window_size(n, default_frac(n) if frac is None else frac)
+    series = pd.Series(y)
+    forward = series.ewm(span=span).mean().values
+    backward = series[::-1].ewm(span=span).mean().values[::-1]
+    return (forward + backward) / 2
+
+
+def lowess_smooth(y, frac=None):
+    """
+    Smooth with statsmodels lowess, the reference the other methods are measured against, see benchmark().
+    :param y: (array) evenly spaced values.
+    :param frac: (float) fraction of points in each window, default 1 / sqrt(n).
+    :return: (array) smoothed values.
+    """
+    import statsmodels.api as sm
+    y = np.asarray(y, dtype=float)
+    return sm.nonparametric.lowess(y, np.arange(len(y)), frac=default_frac(len(y)) if frac is None else frac)[:, 1]
+
+
+SMOOTHERS = {'local': local_regression, 'ewm': ewm_smooth, 'lowess': lowess_smooth}
+
+
+def smooth_series(y, method=SMOOTH_METHOD, frac=None):
+    """
+    Smooth evenly spaced values for a line plot. Results are cached by a hash of the values, so charts of the same
+    series in one report, or in every report of a backfill, are smoothed once.
+    :param y: (array or Series) values, in plot order.
+    :param method: (str) a key of SMOOTHERS.
+    :param frac: (float) fraction of points in each window, default 1 / sqrt(n).
+    :return: (array) smoothed values.
+    """
+    y = np.ascontiguousarray(y, dtype=float)
+    key = (method, frac, len(y), hashlib.md5(y.tobytes()).hexdigest())
+    if key in _CACHE:
+        CACHE_STATS['hits'] += 1
+        return _CACHE[key].copy()
+    CACHE_STATS['misses'] += 1
+    result = SMOOTHERS[method](y, frac)
+    _CACHE[key] = result
+    if len(_CACHE) > SMOOTH_CACHE_SIZE:
+        _CACHE.popitem(last=False)
+    return result.copy()
+
+
+def sample_series(n, seed=0):
+    """
+    Noisy series shaped like nightly sleep hours, for benchmark().
+    :param n: (int) number of points.
+    :param seed: (int) random seed.
+    :return: (array)
+    """
+    random = np.random.RandomState(seed)
+    days = np.arange(n)
+    trend = 7.5 + 0.5 * np.sin(days * 2 * np.pi / 365.) + 0.3 * np.sin(days * 2 * np.pi / 7.)
+    noise = random.normal(0, 0.6, n)
+    # a few nights of much less sleep
+    noise[random.rand(n) < 0.03] -= 3
+    return trend + noise
+
+
+def benchmark(sizes=(7, 31, 365, 1825, 3650), repeat=3):
+    """
+    Time each method on sample series of different lengths and measure its distance from lowess,
+    root mean square of the difference divided by the standard deviation of the series.
+    :param sizes: (tuple) numbers of points.
+    :param repeat: (int) runs of each method, the fastest is reported.
+    :return: (dict) (method, size): (seconds, relative distance)
+    """
+    result = {}
+    for n in sizes:
+        y = sample_series(n)
+        reference = None
+        for method in ['lowess', 'local', 'ewm']:
+            times = []
+            for _ in range(repeat):
+                begin = time.time()
+                smoothed = SMOOTHERS[method](y)
+                times.append(time.time() - begin)
+            if reference is None:
+                reference = smoothed
+            distance = np.sqrt(np.mean((smoothed - reference) ** 2)) / np.std(y)
+            result[(method, n)] = (min(times), distance)
+            print "{0:>6} points {1:<7}{2:9.4f}s  {3:6.1f}x  distance {4:.3f}".format(
+                n, method, min(times), result[('lowess', n)][0] / max(min(times), 1e-9), distance)
+    return result
@@ -0,0 +1,84 @@
+"""This module keeps database in sync with aTimeLogger. It imports no plotting or Evernote module."""
+from db import *
+from time_api import *
+from time_calendar import TZINFO
+
+
+def update_db():
+    """
+    Insert entries in aTimeLogger since last successful sync into database, with DAYS_NEW days of overlap,
+    see get_new_intervals(). Without a recorded sync, last DAYS_NEW days' entries are inserted.
+    Types are only reinserted when aTimeLogger reports them changed.
+    """
+    mysql_switch(1)
+    migrate_db()
+    client = get_client()
+    types = get_types(client, conditional=True)
+    if types is not None:
+        insert_types(types)
+        client.commit_validators()
+    since = get_sync_state(SYNC_WATERMARK)
+    now = arrow.utcnow().timestamp
+    new_entries = get_new_intervals(client, since, now)
+    insert_intervals(new_entries)
+    set_sync_state(SYNC_WATERMARK, now)
+    mysql_switch(0)
+    print "Update complete!"
+
+
+def rebuild_table(table):
+    """
+    Empty all entries in passed table and reinsert current data into table.
+    This function is used when history or types are edited.
+    :param table: A string of table name in database, 'types' or 'intervals'
+    """
+    mysql_switch(1)
+    migrate_db()
+    empty_db(table)
+    client = get_client()
+    echo = 'Please correct your table name!'
+    if table == 'types':
+        types = get_types(client)
+        insert_types(types)
+        echo = "Rebuild types complete!"
+    elif table == 'intervals':
+        intervals = get_all_intervals(client)
+        insert_intervals(intervals)
+        echo = "Rebuild intervals complete!"
+    mysql_switch(0)
+    print echo
+
+
+def rebuild_db(op='truncate', resume=False):
+    """
+    Rebuild the whole database. History is downloaded concurrently in monthly windows and
+    written into database window by window, the end of the last written window is checkpointed.
+    :param op: the option when empty the database, 'truncate' (default) or 'drop'
+    :param resume: (bool) continue an interrupted rebuild from its checkpoint instead of emptying database.
+    """
+    mysql_switch(1)
+    start = None
+    if resume:
+        # the checkpoint is read from `sync_state`, which an old database does not have yet
+        migrate_db()
+        start = get_sync_state(REBUILD_CHECKPOINT)
+    if start is None:
+        if op == 'truncate':
+            migrate_db()
+            empty_db()
+        else:
+            empty_db(op=op)
+            create_all_tables()
+    else:
+        print "Resume rebuild from {0}.".format(arrow.get(start).to(TZINFO))
+    client = get_client()
+    now = arrow.utcnow().timestamp
+    types, windows = fetch_history(client, start, now)
+    insert_types(types)
+    for window_start, window_end, intervals in windows:
+        insert_intervals(intervals)
+        set_sync_state(REBUILD_CHECKPOINT, window_end)
+    clear_sync_state(REBUILD_CHECKPOINT)
+    set_sync_state(SYNC_WATERMARK, now)
+    mysql_switch(0)
+    print "Rebuild database complete!"
@@ -0,0 +1,151 @@
+"""This module generates realistic synthetic aTimeLogger data, the same for every run, to benchmark without an account.
+Usage:
+    build_synthetic_db(5, 'bench/time_5y.db')
+"""
+import os
+import random
+from datetime import date
+from time_calendar import TZINFO, get_calendar
+
+# years of history the benchmarks are run at
+HISTORY_YEARS = (1, 5, 20)
+# history ends on the last day of 2015, benchmarks report periods of its last weeks
+SYNTHETIC_END = date(2016, 1, 1)
+# group: (types, color), type: (color, tasks written as comments)
+SYNTHETIC_GROUPS = [
+    ('Health', 0xCB5E1C, [('Sleep', 0x2F589D, []),
+                          ('Exercise', 0x34A002, ['Run', 'Gym', 'Swim']),
+                          ('Meal', 0xD09340, ['Breakfast', 'Lunch', 'Dinner']),
+                          ('Hygiene', 0x6FCECE, [])]),
+    ('Work', 0x2F589D, [('Code', 0x7F59CC, ['TimeReport', 'Bug fix', 'Code review', 'Refactor']),
+                        ('Meeting', 0xD63EC6, ['Standup', 'Planning', 'One on one']),
+                        ('Email', 0x824D2C, [])]),
+    ('Study', 0x34A002, [('Course', 0xED1F22, ['Statistics', 'Machine learning']),
+                         ('Reading', 0x3C6034, ['Paper', 'Book'])]),
+    ('Fun', 0xD63EC6, [('Game', 0xFF859B, []),
+                       ('Movie', 0xF9E401, []),
+                       ('Social', 0xCB5E1C, ['Friends', 'Family'])]),
+    ('Life', 0x824D2C, [('Chores', 0x6FCECE, ['Laundry', 'Cleaning']),
+                        ('Shopping', 0xD09340, []),
+                        ('Commute', 0x7F59CC, [])]),
+]
+# relative frequency of types in the waking hours of work days and weekends
+WORKDAY_WEIGHTS = {'Exercise': 1, 'Meal': 3, 'Hygiene': 2, 'Code': 8, 'Meeting': 3, 'Email': 3, 'Course': 1,
+                   'Reading': 2, 'Game': 1, 'Movie': 1, 'Social': 1, 'Chores': 1, 'Shopping': 1, 'Commute': 2}
+WEEKEND_WEIGHTS = {'Exercise': 3, 'Meal': 3, 'Hygiene': 2, 'Code': 2, 'Meeting': 0, 'Email': 1, 'Course': 3,
+                   'Reading': 3, 'Game': 3, 'Movie': 3, 'Social': 4, 'Chores': 3, 'Shopping': 2, 'Commute': 1}
+SEC_MINUTE = 60
+SEC_HOUR = 3600
+
+
+def synthetic_types():
+    """
+    Types of the synthetic data, in the format of get_types().
+    :return: A list of dict for types data.
+    """
+    types = []
+    for group_order, (group, color, children) in enumerate(SYNTHETIC_GROUPS):
+        group_guid = 'group-{0}'.format(group.lower())
+        types.append({'guid': group_guid, 'group': True, 'name': group, 'parent': None, 'order': group_order + 1,
+                      'color': color, 'deleted': False, 'revision': 1, 'imageId': 'folder'})
+        for type_order, (name, type_color, tasks) in enumerate(children):
+            types.append({'guid': 'type-{0}'.format(name.lower()), 'group': False, 'name': name,
+                          'parent': {'guid': group_guid}, 'order': type_order + 1, 'color': type_color,
+                          'deleted': False, 'revision': 1, 'imageId': name.lower()})
+    return types
+
+
+def weighted_choice(rng, weights):
+    """
+    Pick a key of weights with probability proportional to its weight.
+    :param rng: random.Random
+    :param weights: (dict) key: weight
+    :return: a key of weights.
+    """
+    keys = sorted(x for x in weights if weights[x] > 0)
+    point = rng.uniform(0, sum(weights[x] for x in keys))
+    for key in keys:
+        point -= weights[key]
+        if point <= 0:
+            return key
+    return keys[-1]
+
+
+def synthetic_intervals(years, seed=0, end=SYNTHETIC_END, tzinfo=TZINFO):
+    """
+    Generate intervals of `years` of history ending at `end`, in the format of get_all_intervals(), oldest first.
+    Days follow local time of tzinfo: waking hours are filled with activities and short gaps, nights are one
+    sleep often starting before midnight, and some weekends have a nap. The last activity of a day and the sleep
+    after it often cross midnight, and nights of daylight saving transitions are an hour shorter or longer.
+    Each day has its own random state, so a day has the same intervals, guids included, whatever the history length.
+    :param years: (int) years of history.
+    :param seed: (int) random seed.
+    :param end: (date) first day after the history.
+    :param tzinfo: A string for timezone, default is TZINFO.
+    :return: generator of dict for intervals data.
+    """
+    first = date(end.year - years, end.month, end.day)
+    calendar = get_calendar(first.year, end.year, tzinfo)
+    tasks = dict((name, tasks) for _, _, children in SYNTHETIC_GROUPS for name, _, tasks in children)
+    bed = None
+    for index in xrange(calendar.day_index(first), calendar.day_index(end)):
+        day = calendar.starts[0][index]
+        midnight, next_midnight = int(calendar.bounds[0][index]), int(calendar.bounds[0][index + 1])
+        rng = random.Random(seed * 1000003 + day.toordinal())
+        weekend = day.weekday() >= 5
+        number = [0]
+
+        def interval(name, start, stop):
+            number[0] += 1
+            comment = None
+            if tasks[name] and rng.random() < 0.6:
+                comment = rng.choice(tasks[name])
+            return {'guid': 'synthetic-{0:%Y%m%d}-{1:02d}'.format(day, number[0]),
+                    'type': {'guid': 'type-{0}'.format(name.lower())}, 'from': start, 'to': stop,
+                    'comment': comment, 'activityGuid': 'synthetic'}
+
+        # up around 7:00, an hour later on weekends, from midnight of local time
+        awake = midnight + int(min(max(rng.gauss(8 if weekend else 7, 0.6), 4.5), 11) * SEC_HOUR)
+        if bed is not None:
+            awake = max(awake, bed + SEC_HOUR)
+            yield interval('Sleep', bed, awake)
+        # bed time around 23:30, later on weekends, sometimes well after midnight
+        bed = next_midnight - 30 * SEC_MINUTE + int(rng.gauss(45 if weekend else 0, 50) * SEC_MINUTE)
+        weights = WEEKEND_WEIGHTS if weekend else WORKDAY_WEIGHTS
+        nap = weekend and rng.random() < 0.3
+        now = awake
+        while now < bed - 10 * SEC_MINUTE:
+            if nap and now > midnight + 13 * SEC_HOUR:
+                stop = now + rng.randint(20, 90) * SEC_MINUTE
+                yield interval('Sleep', now, stop)
+                now, nap = stop, False
+                continue
+            stop = min(now + rng.randint(10, 150) * SEC_MINUTE, bed)
+            yield interval(weighted_choice(rng, weights), now, stop)
+            # untracked gaps between activities
+            now = stop + (rng.randint(1, 20) * SEC_MINUTE if rng.random() < 0.3 else 0)
+        bed = max(bed, now)
+
+
+def build_synthetic_db(years, path, seed=0):
+    """
+    Create an SQLite database of synthetic data, replacing the file if it exists.
+    :param years: (int) years of history, see synthetic_intervals().
+    :param path: (str) SQLite file.
+    :param seed: (int) random seed.
+    :return: (int) number of intervals.
+    """
+    import db
+    for suffix in ['', '-wal', '-shm']:
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    previous = db.SQLITE_PATH
+    db.SQLITE_PATH = path
+    try:
+        with db.use_backend('sqlite'):
+            db.create_all_tables()
+            intervals = list(synthetic_intervals(years, seed))
+            db.insert_all(synthetic_types(), intervals)
+    finally:
+        db.SQLITE_PATH = previous
+    return len(intervals)
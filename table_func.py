@@ -0,0 +1,119 @@
+"""This module builds report tables in ENML, to put into note content instead of table images."""
+from xml.sax.saxutils import escape
+from getdata import get_type_registry
+
+# same fonts as the table charts of plot_func, with a fallback for clients without them
+TEXT_FONT = "Verdana, sans-serif"
+NUMBER_FONT = "DINPro, Verdana, sans-serif"
+HEADER_COLOR = '#808080'
+LABEL_COLOR = '#008000'
+TABLE_STYLE = "border-collapse:collapse;margin-bottom:10px;"
+# colors and fonts are set once per row, cells only add what differs
+ROW_STYLE = "background-color:{background};color:{color};font-family:{font};font-size:{size}px;font-weight:bold;"
+CELL_STYLE = "border:1px solid {border};padding:2px 6px;text-align:{align};white-space:nowrap;"
+
+
+def enml_text(value):
+    """
+    Escape a cell value for ENML.
+    :param value: a string or number.
+    :return: (str) utf-8 encoded.
+    """
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    return escape(str(value))
+
+
+def enml_cell(value, align='center', border='#ffffff', font=None, background=None, color=None, tag='td'):
+    """
+    Make a table cell, styled by its row unless given.
+    :param value: a string or number to show.
+    :param align: (str) 'left' or 'center'.
+    :param border: (str) hexadecimal color code of border.
+    :param font: (str) css font family, default same as row.
+    :param background: (str) hexadecimal color code of cell, default same as row.
+    :param color: (str) hexadecimal color code of text, default same as row.
+    :param tag: (str) 'td' or 'th'.
+    :return: (str) ENML.
+    """
+    style = CELL_STYLE.format(border=border, align=align)
+    if font is not None:
+        style += 'font-family:{0};'.format(font)
+    if background is not None:
+        style += 'background-color:{0};'.format(background)
+    if color is not None:
+        style += 'color:{0};'.format(color)
+    return '<{0} style="{1}">{2}</{0}>'.format(tag, style, enml_text(value))
+
+
+def enml_row(cells, background, color='#ffffff', font=NUMBER_FONT, size=12):
+    """
+    Make a table row.
+    :param cells: (list) ENML cells from enml_cell().
+    :param background: (str) hexadecimal color code of row.
+    :param color: (str) hexadecimal color code of text.
+    :param font: (str) css font family.
+    :param size: (int) font size in pixel.
+    :return: (str) ENML.
+    """
+    style = ROW_STYLE.format(background=background, color=color, font=font, size=size)
+    return '<tr style="{0}">{1}</tr>'.format(style, ''.join(cells))
+
+
+def group_table(data, text_columns, types=None):
+    """
+    Make a table with a header row and one row per entry, each row in the color of its group.
+    :param data: (dataframe) with a 'Group' column, not shown.
+    :param text_columns: (int) number of leading columns of text, left aligned, the rest are numbers.
+    :param types: TypeRegistry, e.g. of a ReportSession, default get_type_registry().
+    :return: (str) ENML.
+    """
+    if types is None:
+        types = get_type_registry()
+    palette = types.palette()
+    groups = data.Group.values
+    data = data.drop('Group', axis=1)
+    rows = [enml_row([enml_cell(label, tag='th') for label in data.columns], HEADER_COLOR, font=TEXT_FONT, size=11)]
+    for group, values in zip(groups, data.values):
+        cells = [enml_cell(val, 'left', font=TEXT_FONT) if j < text_columns else enml_cell(val)
+                 for j, val in enumerate(values)]
+        rows.append(enml_row(cells, palette[group]))
+    return '<table style="{0}">{1}</table>'.format(TABLE_STYLE, ''.join(rows))
+
+
+def task_table_enml(task_data, types=None):
+    """
+    Make task table, same content as task_table_plot().
+    :param task_data: dataframe from get_task_table().
+    :param types: TypeRegistry, e.g. of a ReportSession, default get_type_registry().
+    :return: (str) ENML.
+    """
+    return group_table(task_data, 2, types)
+
+
+def type_table_enml(type_data, types=None):
+    """
+    Make type detail statistics table, same content as type_table_plot().
+    :param type_data: dataframe from get_type_detail().
+    :param types: TypeRegistry, e.g. of a ReportSession, default get_type_registry().
+    :return: (str) ENML.
+    """
+    return group_table(type_data, 1, types)
+
+
+def sleep_table_enml(data):
+    """
+    Make sleep compare table, same content as sleep_table_plot().
+    :param data: dataframe from sleep_compare(), or the message it returns without data.
+    :return: (str) ENML.
+    """
+    if isinstance(data, basestring):
+        return '<div>{0}</div>'.format(enml_text(data))
+    rows = [enml_row(['<th></th>'] + [enml_cell(label, tag='th') for label in data.columns],
+                     HEADER_COLOR, font=TEXT_FONT, size=13)]
+    for label, values in zip(data.index, data.values):
+        cells = [enml_cell(label, border=HEADER_COLOR, font=TEXT_FONT, background=LABEL_COLOR,
+                           color='#ffffff', tag='th')]
+        cells += [enml_cell(val, border=HEADER_COLOR) for val in values]
+        rows.append(enml_row(cells, '#ffffff', '#000000', size=16))
+    return '<table style="{0}">{1}</table>'.format(TABLE_STYLE, ''.join(rows))
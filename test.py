@@ -1,195 +1,92 @@
-"""Main module to combine functions into complete services"""
-
-from db import *
-from time_api import *
-from note import *
-from plot_func import *
+"""Main module to combine functions into complete services.
+Each operation imports its dependencies when it runs, so syncing database never loads plotting or Evernote modules.
+"""
 import argparse
+import subprocess
+import sys
 
+# statements each operation runs before its work starts, see startup_benchmark()
+STARTUP_IMPORTS = {
+    'update': 'import sync',
+    'report': 'import sync, report',
+    'eager': 'from db import *; from time_api import *; from note import *; from plot_func import *',
+}
+HEAVY_MODULES = ['pandas', 'matplotlib', 'evernote']
 
-def update_db():
-    """Insert last two days' entries in aTimeLogger into database."""
-    mysql_switch(1)
-    auth_header = get_auth_header()
-    new_entries = get_new_intervals(auth_header)
-    insert_intervals(new_entries)
-    mysql_switch(0)
-    print "Update complete!"
 
+def run_update(args):
+    """Insert new entries into database."""
+    from sync import update_db
+    update_db()
 
-def rebuild_table(table):
-    """
-    Empty all entries in passed table and reinsert current data into table.
-    This function is used when history or types are edited.
-    :param table: A string of table name in database, 'types' or 'intervals'
-    """
-    empty_db(table)
-    mysql_switch(1)
-    auth_header = get_auth_header()
-    echo = 'Please correct your table name!'
-    if table == 'types':
-        types = get_types(auth_header)
-        insert_types(types)
-        echo = "Rebuild types complete!"
-    elif table == 'intervals':
-        intervals = get_all_intervals(auth_header)
-        insert_types(intervals)
-        echo = "Rebuild intervals complete!"
-    mysql_switch(0)
-    print echo
 
+def run_rebuild(args):
+    """Empty database and reinsert all data, or resume an interrupted rebuild."""
+    from sync import rebuild_db
+    rebuild_db(resume=args.resume)
 
-def rebuild_db(op='truncate'):
-    """
-    Rebuild the whole database.
-    :param op: the option when empty the database, 'truncate' (default) or 'drop'
-    """
+
+def run_copy(args):
+    """Copy MySQL database into SQLite."""
+    from db import mysql_switch, copy_db
     mysql_switch(1)
-    if op == 'truncate':
-        empty_db()
-    else:
-        empty_db(op=op)
-        create_all_tables()
-    auth_header = get_auth_header()
-    types = get_types(auth_header)
-    intervals = get_all_intervals(auth_header)
-    insert_all(types, intervals)
+    copy_db('mysql', 'sqlite')
     mysql_switch(0)
-    print "Rebuild database complete!"
 
 
-def daily_report(date=None):
-    """
-    Generate daily report in Evernote.
-    Report content: 1.Date info, 2.Sleep table, 3.Group pie chart, 4.Task table.
-    :param date: A string of date in the format 'YYYYMMDD', default None for yesterday.
-    """
-    mysql_switch(1)
-    if date:
-        start, end = str2level_range(date, 0)
-        date_info = day_info(date)
-    else:
-        # TODO Replace human_qr with str2level_range
-        start, end = human_qr('last 1 days')
-        date_info = day_info()
-    title = ts2str_level(start, 0)
-    tags = date_tag(start, 0)
-    sleep_table_plot(sleep_compare(date))
-    last_cut = get_cut_level_dataframe(start, end, 0)
-    group_pie_plot(last_cut)
-    task_data = get_task_table(last_cut)
-
-    dev_token, note_store = connect_note()
-
-    # in case of early date with zero task
-    if task_data.shape[0] != 0:
-        task_table_plot(task_data)
-        resources = create_resources(['img/sleep_table.png', 'img/group_pie.png', 'img/task_table.png'])
-        headings = ['1. Good Morning!', '2. What\'s up?', '3. How are things going?']
-        widths = [500, None, None]
-    else:
-        resources = create_resources(['img/sleep_table.png', 'img/group_pie.png'])
-        headings = ['1. Good Morning!', '2. What\'s up?']
-        widths = [500, None]
-    # create_daily_note(dev_token, note_store, title, date_info, resources, headings, widths)
-    create_note(dev_token, note_store, 0, title, resources, headings, widths, tags, date_info)
-    mysql_switch(0)
-    print "Generate daily report for {0}!".format(title)
+def run_report(args):
+    """Update database, then generate report."""
+    from sync import update_db
+    from report import gen_report
+    if not args.no_update:
+        update_db()
+    gen_report(args.level, args.date)
 
 
-def weekly_report(week=None):
-    """
-    Generate weekly report in Evernote.
-    Report content: 1.Group pie chart, 2.Type table, 3.Group stacked bar chart, 4. Type grid chart, 5. Sleep plot.
-    :param week: A string of week number in the format 'YYYYWww', e.g '2015W07'. Default None for last week.
-    """
-    mysql_switch(1)
-    if week:
-        start, end = str2level_range(week, 1)
-    else:
-        now = arrow.get(datetime.now(), 'US/Eastern')
-        start, end = str2level_range(now.strftime('%YW%V'), 1)
-    start_date = ts2datetime(start).strftime('%b %d')
-    end_date = ts2datetime(end-1).strftime('%b %d')
-    title = ts2datetime(start).strftime("%Y Week%V ({0} - {1})".format(start_date, end_date))
-    tags = date_tag(start, 1)
-
-    cut_data = get_cut_dataframe(start, end)
-    group_pie_plot(cut_data)
-    type_data = get_type_detail(cut_data)
-    type_table_plot(type_data)
-    agg_data_group = agg_level(start, end, 'group', 0)
-    group_barh_plot(agg_data_group, 0)
-    agg_data_type = agg_level(start, end, 'type', 0)
-    type_bar_grid_plot(agg_data_type, 0)
-    sleep_data = get_sleep_dataframe(start, end)
-    sleep_plot(sleep_data)
-
-    dev_token, note_store = connect_note()
-    resources = create_resources(['img/group_pie.png', 'img/type_table.png', 'img/group_bar.png',
-                                  'img/type_bar_grid.png', 'img/sleep_plot.png'])
-    headings = ['1. Group Overview', '2. Type Detail', '3. Group Trends', '4. Type Trends', '5. Sleep Trends']
-    widths = [None] * 5
-    # create_weekly_note(dev_token, note_store, title, resources, headings, widths)
-    create_note(dev_token, note_store, 1, title, resources, headings, widths, tags)
-    mysql_switch(0)
-    print "Generate weekly report for {0}!".format(title)
+def run_backfill(args):
+    """Generate reports of every day/week/month in a range from one load of the database."""
+    from report import backfill, RENDER_WORKERS, BACKFILL_FOLDER
+    folder = BACKFILL_FOLDER if not args.no_save else None
+    backfill(args.first, args.last, args.level, publish=not args.no_publish,
+             workers=args.workers or RENDER_WORKERS, folder=folder)
 
 
-def monthly_report(month=None):
+def startup_benchmark(repeat=5):
     """
-    Generate monthly report in Evernote.
-    Report content: 1.Group pie chart, 2.Type table, 3.Group stacked bar chart, 4. Type grid chart, 5. Sleep plot.
-    :param month: A string of month number in the format 'YYYYMmm', e.g '2015M02'. Default None for last month.
+    Time the imports of each operation in a fresh interpreter, the cold start cost before any work.
+    'eager' is what every operation used to import.
+    :param repeat: (int) number of runs of each operation, the fastest is reported.
+    :return: (dict) operation: (seconds, list of heavy modules loaded)
     """
-    mysql_switch(1)
-    if month:
-        start, end = str2level_range(month, 2)
-    else:
-        now = arrow.get(datetime.now(), 'US/Eastern')
-        start, end = str2level_range(now.strftime('%YM%m'), 2)
-    start_week = ts2datetime(start).strftime('%V')
-    end_week = ts2datetime(end-1).strftime('%V')
-    title = ts2datetime(start).strftime("%Y Month%m (W{0} - W{1})".format(start_week, end_week))
-    tags = date_tag(start, 2)
-
-    cut_data = get_cut_dataframe(start, end)
-    group_pie_plot(cut_data)
-    type_data = get_type_detail(cut_data)
-    type_table_plot(type_data)
-    agg_data_group = agg_level(start, end, 'group', 1)
-    group_barh_plot(agg_data_group, 1)
-    agg_data_type = agg_level(start, end, 'type', 1)
-    type_bar_grid_plot(agg_data_type, 1)
-    sleep_data = get_sleep_dataframe(start, end)
-    sleep_plot(sleep_data)
-
-    dev_token, note_store = connect_note()
-    resources = create_resources(['img/group_pie.png', 'img/type_table.png', 'img/group_bar.png',
-                                  'img/type_bar_grid.png', 'img/sleep_plot.png'])
-    headings = ['1. Group Overview', '3. Type Detail', '2. Group Trends', '4. Type Trends', '5. Sleep Trends']
-    widths = [None] * 5
-    create_note(dev_token, note_store, 2, title, resources, headings, widths, tags)
-    mysql_switch(0)
-    print "Generate monthly report for {0}!".format(title)
+    code = ("import sys, time\n"
+            "begin = time.time()\n"
+            "{0}\n"
+            "print time.time() - begin\n"
+            "print ' '.join(x for x in {1!r} if x in sys.modules)")
+    result = {}
+    for name, statement in sorted(STARTUP_IMPORTS.items()):
+        runs = [subprocess.check_output([sys.executable, '-c', code.format(statement, HEAVY_MODULES)]).split('\n')
+                for _ in range(repeat)]
+        result[name] = (min(float(x[0]) for x in runs), runs[0][1].split())
+        print "{0:<8}{1:.3f}s  loads: {2}".format(name, result[name][0], ", ".join(result[name][1]) or "-")
+    return result
 
 
-def gen_report(level=0, date=None):
-    """
-    Report wrapper function.
-    :param level: An integer for different time levels. 0: daily (default), 1: weekly, 2: monthly.
-    :param date: A string to specify date/week/month.
-    """
-    if level == 0:
-        daily_report(date)
-    elif level == 1:
-        weekly_report(date)
-    elif level == 2:
-        monthly_report(date)
+def run_startup(args):
+    """Print import time of each operation."""
+    startup_benchmark(args.repeat)
+
+
+def run_smooth(args):
+    """Print time and distance from lowess of each smoothing method."""
+    from smooth import benchmark
+    benchmark(repeat=args.repeat)
 
 
 def test_func():
     """Test function"""
+    from db import mysql_switch
+    from report import weekly_report
     mysql_switch(1)
     # start, end = human_qr('last 1 week')
     # cut_data = get_cut_dataframe(start, end)
@@ -211,21 +108,36 @@ def test_func():
 def main():
     # Add argument to program for more flexible console control
     parser = argparse.ArgumentParser(description='Report system actions.')
-    parser.add_argument("-o", "--operation", choices=['re', 'db'], default='re', help="choose operation (default: re)")
-    parser.add_argument("-u", "--update", type=int, choices=[0, 1], help="update or rebuild db")
-    parser.add_argument("-l", "--level", type=int, default=0, choices=[0, 1, 2],
+    commands = parser.add_subparsers(title='operations')
+    report = commands.add_parser('report', help="update database and generate report")
+    report.add_argument("-l", "--level", type=int, default=0, choices=[0, 1, 2],
                         help="choose the report level (default: 0)")
-    parser.add_argument("-d", "--date", help="Specify date/week/month for report. "
+    report.add_argument("-d", "--date", help="Specify date/week/month for report. "
                                              "Day: '19970215'; Week: '1999W05'; Year: '2010M02'")
+    report.add_argument("--no-update", action='store_true', help="report from database as it is")
+    report.set_defaults(func=run_report)
+    commands.add_parser('update', help="insert new entries into database").set_defaults(func=run_update)
+    rebuild = commands.add_parser('rebuild', help="empty database and reinsert all data")
+    rebuild.add_argument("--resume", action='store_true', help="resume an interrupted rebuild")
+    rebuild.set_defaults(func=run_rebuild)
+    backfill = commands.add_parser('backfill', help="generate reports of every day/week/month in a range")
+    backfill.add_argument("first", help="first date/week/month, same format as report --date")
+    backfill.add_argument("last", help="last date/week/month, included")
+    backfill.add_argument("-l", "--level", type=int, default=0, choices=[0, 1, 2],
+                          help="choose the report level (default: 0)")
+    backfill.add_argument("--no-publish", action='store_true', help="only render charts, do not create notes")
+    backfill.add_argument("--no-save", action='store_true', help="keep charts in memory, do not write image files")
+    backfill.add_argument("-w", "--workers", type=int, help="render processes (default: one per core, at most 5)")
+    backfill.set_defaults(func=run_backfill)
+    commands.add_parser('copy', help="copy MySQL database into SQLite").set_defaults(func=run_copy)
+    startup = commands.add_parser('startup', help="time the imports of each operation")
+    startup.add_argument("-r", "--repeat", type=int, default=5, help="runs of each operation (default: 5)")
+    startup.set_defaults(func=run_startup)
+    smooth = commands.add_parser('smooth', help="compare smoothing methods with lowess")
+    smooth.add_argument("-r", "--repeat", type=int, default=3, help="runs of each method (default: 3)")
+    smooth.set_defaults(func=run_smooth)
     args = parser.parse_args()
-    if args.operation == 're':
-        update_db()
-        gen_report(args.level, args.date)
-    else:
-        if args.update == 0:
-            update_db()
-        else:
-            rebuild_db()
+    args.func(args)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,69 @@
+"""Tests of report trends answered from the daily rollup, on a synthetic SQLite database."""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+import getdata
+from analysis import agg_level, agg_level_rollup
+from getdata import ReportSession
+from synthetic import build_synthetic_db, synthetic_intervals, synthetic_types
+from time_func import str2level_range
+
+
+class RollupTrendTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.mkdtemp()
+        cls.synthetic = os.path.join(cls.folder, 'time_1y.db')
+        build_synthetic_db(1, cls.synthetic)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.folder)
+
+    def setUp(self):
+        self.path, self.backend, self.migrations = db.SQLITE_PATH, db._BACKEND['name'], db.MIGRATIONS
+        db.SQLITE_PATH = self.synthetic
+        db._BACKEND['name'] = 'sqlite'
+        getdata._REGISTRY.clear()
+
+    def tearDown(self):
+        db.SQLITE_PATH, db._BACKEND['name'], db.MIGRATIONS = self.path, self.backend, self.migrations
+        getdata._REGISTRY.clear()
+
+    def test_backfill_span_queries_rollup_once(self):
+        weeks = [str2level_range('2015W{0:02d}'.format(x), 1) for x in range(44, 49)]
+        span = ReportSession(weeks[0][0], weeks[-1][1])
+        span.rollup()
+        stats = dict(db.POOL_STATS)
+        trends = [agg_level(start, end, 'type', 0, session=span.period(start, end), rollup=True)
+                  for start, end in weeks]
+        # every week is sliced from the rows of the span, no connection is opened
+        self.assertEqual(db.POOL_STATS, stats)
+        for (start, end), trend in zip(weeks, trends):
+            self.assertTrue(trend.equals(agg_level_rollup(start, end, 'type', 0)))
+            self.assertEqual(trend.Sum.sum(), agg_level(start, end, 'type', 0).Sum.sum())
+
+    def test_database_without_rollup(self):
+        db.SQLITE_PATH = os.path.join(self.folder, 'old.db')
+        db.MIGRATIONS = [x for x in self.migrations if x[0] <= 2]
+        db.create_all_tables()
+        db.insert_types(synthetic_types())
+        db.bulk_replace('intervals', db.INTERVAL_COLUMNS, [db.interval_row(x) for x in synthetic_intervals(1)])
+        db.MIGRATIONS = self.migrations
+        start, end = str2level_range('2015M11', 2)
+        session = ReportSession(start, end)
+        self.assertIsNone(session.rollup())
+        raw = agg_level(start, end, 'group', 1, session=session)
+        self.assertTrue(agg_level(start, end, 'group', 1, session=session, rollup=True).equals(raw))
+        self.assertTrue(agg_level(start, end, 'group', 1, rollup=True).equals(raw))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+"""Tests of schema migrations on an SQLite database."""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+from synthetic import synthetic_intervals, synthetic_types
+
+
+class MigrationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path, self.backend, self.migrations = db.SQLITE_PATH, db._BACKEND['name'], db.MIGRATIONS
+        db.SQLITE_PATH = os.path.join(self.folder, 'time.db')
+        db._BACKEND['name'] = 'sqlite'
+
+    def tearDown(self):
+        db.SQLITE_PATH, db._BACKEND['name'], db.MIGRATIONS = self.path, self.backend, self.migrations
+        shutil.rmtree(self.folder)
+
+    def create_at(self, version):
+        """Create tables at an old schema version and fill intervals, without rollup."""
+        db.MIGRATIONS = [x for x in self.migrations if x[0] <= version]
+        db.create_types_table()
+        db.create_intervals_table()
+        db.migrate_db()
+        rows = [db.interval_row(x) for x in synthetic_intervals(1)]
+        db.bulk_replace('types', db.TYPE_COLUMNS, [db.type_row(x) for x in synthetic_types()])
+        db.bulk_replace('intervals', db.INTERVAL_COLUMNS, rows)
+        db.MIGRATIONS = self.migrations
+
+    def rollup(self):
+        cnx, cursor = db.connect_db()
+        cursor.execute("select count(*), sum(seconds), count(sketch) from daily_type_rollup")
+        result = cursor.fetchone()
+        db.release_db(cnx)
+        return result
+
+    def intervals_seconds(self):
+        cnx, cursor = db.connect_db()
+        cursor.execute("select sum(delta) from intervals")
+        result = cursor.fetchone()[0]
+        db.release_db(cnx)
+        return result
+
+    def test_upgrade_from_every_version(self):
+        latest = self.migrations[-1][0]
+        for version in [2, 3]:
+            self.create_at(version)
+            self.assertEqual(db.migrate_db(), latest)
+            rows, seconds, sketches = self.rollup()
+            self.assertGreater(rows, 0)
+            self.assertEqual(seconds, self.intervals_seconds())
+            self.assertEqual(sketches, rows)
+            self.assertEqual(db.get_sync_state(db.DATA_STEP_STATE + 'rebuild_rollup'), latest)
+            db.empty_db(op='drop')
+
+    def test_failed_data_migration_runs_again(self):
+        self.create_at(2)
+        calls = []
+
+        def failed():
+            calls.append(1)
+            raise IOError('disk full')
+        latest = self.migrations[-1][0]
+        db.MIGRATIONS = self.migrations + [(latest + 1, 'test data', [('data', 'failed')])]
+        db.DATA_STEPS['failed'] = failed
+        try:
+            self.assertRaises(IOError, db.migrate_db)
+            self.assertRaises(IOError, db.migrate_db)
+        finally:
+            del db.DATA_STEPS['failed']
+        self.assertEqual(len(calls), 2)
+        # steps that succeeded are recorded and not run again, the failed one is not recorded
+        self.assertEqual(db.get_sync_state(db.DATA_STEP_STATE + 'rebuild_rollup'), latest)
+        self.assertIsNone(db.get_sync_state(db.DATA_STEP_STATE + 'failed'))
+
+    def test_step_of_several_migrations_runs_once(self):
+        self.create_at(2)
+        rebuild_rollup, calls = db.DATA_STEPS['rebuild_rollup'], []
+        db.DATA_STEPS['rebuild_rollup'] = lambda: calls.append(1)
+        try:
+            db.migrate_db()
+            db.migrate_db()
+        finally:
+            db.DATA_STEPS['rebuild_rollup'] = rebuild_rollup
+        self.assertEqual(len(calls), 1)
+
+    def test_truncate_keeps_data_steps(self):
+        self.create_at(2)
+        db.migrate_db()
+        db.empty_db()
+        self.assertEqual(db.get_sync_state(db.DATA_STEP_STATE + 'rebuild_rollup'), self.migrations[-1][0])
+
+if __name__ == '__main__':
+    unittest.main()
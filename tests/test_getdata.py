@@ -0,0 +1,49 @@
+"""Tests of type metadata cached for the process."""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+import getdata
+from synthetic import synthetic_types
+
+
+class TypeRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path, self.backend = db.SQLITE_PATH, db._BACKEND['name']
+        db._BACKEND['name'] = 'sqlite'
+        getdata._REGISTRY.clear()
+
+    def tearDown(self):
+        db.SQLITE_PATH, db._BACKEND['name'] = self.path, self.backend
+        getdata._REGISTRY.clear()
+        shutil.rmtree(self.folder)
+
+    def create(self, name, types):
+        db.SQLITE_PATH = os.path.join(self.folder, name)
+        db.create_all_tables()
+        db.insert_types(types)
+
+    def test_other_database_within_ttl(self):
+        renamed = synthetic_types()
+        for item in renamed:
+            if item['name'] == 'Code':
+                item['name'] = 'Programming'
+        # same revision and count of types, only the path tells the databases apart
+        self.create('renamed.db', renamed)
+        self.create('time.db', synthetic_types())
+        self.assertIn('Code', getdata.get_type_registry().type_group)
+        db.SQLITE_PATH = os.path.join(self.folder, 'renamed.db')
+        types = getdata.get_type_registry().type_group
+        self.assertIn('Programming', types)
+        self.assertNotIn('Code', types)
+
+
+if __name__ == '__main__':
+    unittest.main()
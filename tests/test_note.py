@@ -0,0 +1,102 @@
+"""Tests of publishing report notes, on the in-memory note store."""
+import hashlib
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import evernote.edam.type.ttypes as ever_types
+from note import (KNOWN_NOTEBOOKS, NOTEBOOK_NAMES, MemoryNoteStore, NoteClient, NotePublisher,
+                  create_resources)
+from plot_help import ChartImage
+
+
+def report():
+    """Arguments of NotePublisher.publish() of a weekly report with one chart and one table."""
+    data = 'chart bytes'
+    resources = create_resources([ChartImage(data, hashlib.md5(data).digest())]) + ['<div>table</div>']
+    return (1, '2015W48', '2015 Week48', resources), {'headings': ['Chart', 'Table'], 'widths': [None, None]}
+
+
+class PublisherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = MemoryNoteStore()
+        client = NoteClient(auth_token='token', note_store=self.store, notebooks_file=None)
+        self.publisher = NotePublisher(client, index_file=None)
+
+    def publish(self):
+        args, kwargs = report()
+        return self.publisher.publish(*args, **kwargs)
+
+    def test_unchanged(self):
+        note = self.publish()
+        self.assertIsNone(self.publish())
+        self.assertEqual(self.publisher.stats['unchanged'], 1)
+        self.assertEqual(self.store.notes.keys(), [note.guid])
+
+    def test_deleted_on_evernote(self):
+        note = self.publish()
+        self.store.deleteNote('token', note.guid)
+        again = self.publish()
+        self.assertIsNotNone(again)
+        self.assertEqual(self.publisher.stats['created'], 2)
+        self.assertEqual(self.store.notes.keys(), [again.guid])
+
+    def test_in_trash_on_evernote(self):
+        note = self.publish()
+        self.store.notes[note.guid].active = False
+        self.assertIsNotNone(self.publish())
+        self.assertEqual(self.publisher.stats['created'], 2)
+
+    def test_changed_and_in_trash(self):
+        note = self.publish()
+        self.store.notes[note.guid].active = False
+        args, kwargs = report()
+        args = args[:3] + (args[3][:1] + ['<div>new table</div>'],)
+        self.assertIsNotNone(self.publisher.publish(*args, **kwargs))
+        self.assertEqual(self.publisher.stats['updated'], 1)
+        self.assertTrue(self.store.notes[note.guid].active)
+        self.assertIn('new table', self.store.notes[note.guid].content)
+
+    def test_edited_on_evernote(self):
+        note = self.publish()
+        edited = self.store.notes[note.guid]
+        edited.content = edited.content.replace('table', 'edited')
+        edited.contentHash = hashlib.md5(edited.content).digest()
+        self.assertIsNotNone(self.publish())
+        self.assertEqual(self.publisher.stats['updated'], 1)
+        self.assertIn('table', self.store.notes[note.guid].content)
+        # the chart is kept on Evernote, not sent again
+        self.assertEqual(self.publisher.stats['kept'], 1)
+
+
+class NotebookTest(unittest.TestCase):
+
+    def client(self, store, **kwargs):
+        return NoteClient(auth_token='token', note_store=store, notebooks_file=None, **kwargs)
+
+    def test_known_guid_first(self):
+        # another notebook has the name, the known notebook was renamed
+        store = MemoryNoteStore()
+        store.notebooks.append(ever_types.Notebook(guid=KNOWN_NOTEBOOKS['review'], name='Weekly'))
+        self.assertEqual(self.client(store).report_notebook(1), KNOWN_NOTEBOOKS['review'])
+        # known guids are by role, whatever the names are
+        self.assertEqual(self.client(store, names={'review': 'Reports'}).report_notebook(2),
+                         KNOWN_NOTEBOOKS['review'])
+
+    def test_name_when_known_guid_gone(self):
+        store = MemoryNoteStore()
+        by_name = dict((x.name, x.guid) for x in store.notebooks)
+        self.assertEqual(self.client(store).report_notebook(1), by_name[NOTEBOOK_NAMES['review']])
+        self.assertEqual(self.client(store).report_notebook(0), by_name[NOTEBOOK_NAMES['diary']])
+
+    def test_not_found(self):
+        store = MemoryNoteStore()
+        self.assertRaises(ValueError, self.client(store, names={'review': 'Reports'}).report_notebook, 1)
+        store.notebooks = []
+        self.assertRaises(ValueError, self.client(store).report_notebook, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+"""Tests of mergeable duration summaries behind the daily rollup."""
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from sketch import SKETCH_ALPHA, QuantileSketch, merge_sketches
+
+
+def durations(n, seed):
+    """Interval lengths in seconds, from a minute to a day, skewed like real logs."""
+    rng = random.Random(seed)
+    return [int(min(max(rng.lognormvariate(7.5, 1.2), 60), 86400)) for _ in range(n)]
+
+
+class QuantileSketchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.parts = [durations(500, seed) for seed in range(3)]
+
+    def test_merge_is_associative(self):
+        a, b, c = [QuantileSketch.from_values(x) for x in self.parts]
+        left = QuantileSketch().merge(a).merge(b).merge(c)
+        a, b, c = [QuantileSketch.from_values(x) for x in self.parts]
+        right = QuantileSketch().merge(a).merge(QuantileSketch().merge(b).merge(c))
+        self.assertEqual(left.bins, right.bins)
+        self.assertEqual(left.zero, right.zero)
+        # merging gives the same sketch as adding every value to one
+        whole = QuantileSketch.from_values(sum(self.parts, []))
+        self.assertEqual(left.bins, whole.bins)
+
+    def test_json_round_trip(self):
+        sketch = QuantileSketch.from_values(self.parts[0] + [0, 0])
+        loaded = QuantileSketch.from_json(sketch.to_json())
+        self.assertEqual(loaded.alpha, sketch.alpha)
+        self.assertEqual(loaded.zero, 2)
+        self.assertEqual(loaded.bins, sketch.bins)
+        self.assertEqual(loaded.quantile(0.5), sketch.quantile(0.5))
+
+    def test_relative_error_bound(self):
+        values = sum(self.parts, [])
+        merged = merge_sketches(QuantileSketch.from_values(x).to_json() for x in self.parts)
+        self.assertEqual(merged.count, len(values))
+        for q in [0., 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 1.]:
+            true = np.percentile(values, q * 100)
+            self.assertLessEqual(abs(merged.quantile(q) - true), SKETCH_ALPHA * true + 1e-9)
+
+    def test_empty_and_zero(self):
+        self.assertTrue(np.isnan(QuantileSketch().quantile(0.5)))
+        self.assertEqual(QuantileSketch.from_values([0, 0, 5]).quantile(0.5), 0.)
+
+    def test_merge_other_accuracy(self):
+        self.assertRaises(ValueError, QuantileSketch(0.01).merge, QuantileSketch(0.02))
+
+
+if __name__ == '__main__':
+    unittest.main()
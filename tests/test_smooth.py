@@ -0,0 +1,73 @@
+"""Tests of smoothing series for line plots."""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import smooth
+from smooth import lowess_smooth, local_regression, sample_series, smooth_series
+
+
+def distance(smoothed, reference, y):
+    """Root mean square of the difference divided by the standard deviation of the series, as in benchmark()."""
+    return np.sqrt(np.mean((smoothed - reference) ** 2)) / np.std(y)
+
+
+class LocalRegressionTest(unittest.TestCase):
+
+    def test_close_to_lowess(self):
+        for n in [31, 365, 1825]:
+            for seed in range(3):
+                y = sample_series(n, seed)
+                self.assertLess(distance(local_regression(y), lowess_smooth(y), y), 0.15)
+
+    def test_short_series(self):
+        # a window holds the whole series, the fit is the same line as lowess
+        y = sample_series(7)
+        np.testing.assert_allclose(local_regression(y), lowess_smooth(y))
+        np.testing.assert_array_equal(local_regression([1., 2.]), [1., 2.])
+
+    def test_line_is_kept(self):
+        y = np.arange(50.) * 2 + 1
+        np.testing.assert_allclose(local_regression(y), y)
+
+
+class SmoothSeriesTest(unittest.TestCase):
+
+    def setUp(self):
+        smooth._CACHE.clear()
+        self.stats = dict(smooth.CACHE_STATS)
+
+    def counted(self, name):
+        return smooth.CACHE_STATS[name] - self.stats[name]
+
+    def test_cache_key(self):
+        y = sample_series(100)
+        first = smooth_series(y)
+        # same values in another container are the same key
+        np.testing.assert_array_equal(smooth_series(list(y)), first)
+        self.assertEqual((self.counted('hits'), self.counted('misses')), (1, 1))
+        # other values, method or window are other keys
+        changed = y.copy()
+        changed[50] += 1
+        smooth_series(changed)
+        smooth_series(y, method='ewm')
+        smooth_series(y, frac=0.3)
+        self.assertEqual((self.counted('hits'), self.counted('misses')), (1, 4))
+
+    def test_cached_result_is_a_copy(self):
+        y = sample_series(100)
+        first = smooth_series(y)
+        first[:] = 0
+        self.assertFalse((smooth_series(y) == 0).all())
+
+    def test_cache_size(self):
+        for n in range(smooth.SMOOTH_CACHE_SIZE + 10):
+            smooth_series(np.arange(n + 3.))
+        self.assertEqual(len(smooth._CACHE), smooth.SMOOTH_CACHE_SIZE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+"""Tests of syncing intervals from aTimeLogger into an SQLite database, with a fake API client."""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import arrow
+import db
+import sync
+import time_api
+from synthetic import synthetic_types
+
+SEC_HOUR = 3600
+
+
+class FakeClient(object):
+    """API client serving intervals from memory, filtered by their start like the strictest reading of the API."""
+
+    def __init__(self, intervals):
+        self.intervals = intervals
+
+    def get(self, path, params=None, conditional=False):
+        if path == '/types':
+            return None if conditional else {'types': synthetic_types()}
+        params = params or {}
+        start, end = int(params.get('from', 0)), int(params.get('to', 2 ** 31))
+        found = [x for x in self.intervals if start <= x['from'] < end]
+        offset = params.get('offset', 0)
+        return {'intervals': found[offset:offset + params.get('limit', len(found))]}
+
+
+class FakeResponse(object):
+    """Response of the types endpoint with a new ETag."""
+    status_code = 200
+    headers = {'ETag': 'new'}
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {'types': synthetic_types()}
+
+
+class FakeSession(object):
+    """HTTP session answering every request with FakeResponse."""
+
+    def get(self, url, **kwargs):
+        return FakeResponse()
+
+
+def interval(guid, start, stop):
+    return {'guid': guid, 'type': {'guid': 'type-code'}, 'from': start, 'to': stop, 'comment': None,
+            'activityGuid': 'test'}
+
+
+class UpdateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path, self.backend = db.SQLITE_PATH, db._BACKEND['name']
+        db.SQLITE_PATH = os.path.join(self.folder, 'time.db')
+        db._BACKEND['name'] = 'sqlite'
+        db.create_all_tables()
+        db.insert_types(synthetic_types())
+
+    def tearDown(self):
+        db.SQLITE_PATH, db._BACKEND['name'] = self.path, self.backend
+        time_api._CLIENT.pop('client', None)
+        shutil.rmtree(self.folder)
+
+    def stored_guids(self):
+        cnx, cursor = db.connect_db()
+        cursor.execute("select guid from intervals")
+        guids = set(x[0] for x in cursor.fetchall())
+        db.release_db(cnx)
+        return guids
+
+    def test_interval_running_at_last_sync(self):
+        # the watermark was set while the interval was running, it ends after the watermark
+        watermark = arrow.utcnow().timestamp - SEC_HOUR
+        db.set_sync_state(db.SYNC_WATERMARK, watermark)
+        time_api._CLIENT['client'] = FakeClient([interval('running', watermark - SEC_HOUR, watermark + 600),
+                                                 interval('new', watermark + 600, watermark + 1200)])
+        sync.update_db()
+        self.assertEqual(self.stored_guids(), set(['running', 'new']))
+        self.assertGreater(db.get_sync_state(db.SYNC_WATERMARK), watermark)
+
+    def test_interval_logged_late(self):
+        # logged after last sync, with a start a day before it
+        watermark = arrow.utcnow().timestamp - SEC_HOUR
+        db.set_sync_state(db.SYNC_WATERMARK, watermark)
+        late = interval('late', watermark - 24 * SEC_HOUR, watermark - 23 * SEC_HOUR)
+        time_api._CLIENT['client'] = FakeClient([late])
+        sync.update_db()
+        self.assertEqual(self.stored_guids(), set(['late']))
+
+    def test_types_validator_after_failed_insert(self):
+        # types changed but were not written, the next sync must not be told they are unchanged
+        client = time_api.TimeLoggerClient(auth_header=('user', 'password'), validators_file=None)
+        client.session = FakeSession()
+        time_api._CLIENT['client'] = client
+        insert_types = sync.insert_types
+
+        def failed_insert(types):
+            raise IOError('disk full')
+        sync.insert_types = failed_insert
+        try:
+            self.assertRaises(IOError, sync.update_db)
+        finally:
+            sync.insert_types = insert_types
+        self.assertEqual(client.validators, {})
+
+
+class RebuildTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path, self.backend = db.SQLITE_PATH, db._BACKEND['name']
+        db.SQLITE_PATH = os.path.join(self.folder, 'time.db')
+        db._BACKEND['name'] = 'sqlite'
+        # tables of a database made before migrations, without `sync_state`
+        db.create_types_table()
+        db.create_intervals_table()
+
+    def tearDown(self):
+        db.SQLITE_PATH, db._BACKEND['name'] = self.path, self.backend
+        time_api._CLIENT.pop('client', None)
+        shutil.rmtree(self.folder)
+
+    def test_resume_before_migration(self):
+        now = arrow.utcnow().timestamp
+        time_api._CLIENT['client'] = FakeClient([interval('old', now - 48 * SEC_HOUR, now - 47 * SEC_HOUR)])
+        sync.rebuild_db(resume=True)
+        self.assertEqual(db.get_schema_version(), db.MIGRATIONS[-1][0])
+        self.assertIsNone(db.get_sync_state(db.REBUILD_CHECKPOINT))
+        self.assertGreaterEqual(db.get_sync_state(db.SYNC_WATERMARK), now)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+"""Tests of the calendar and vectorized time conversions against the per-row Arrow functions."""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import arrow
+import pandas as pd
+from datetime import date
+from getdata import split_at_points
+from time_calendar import Calendar, get_calendar
+from time_func import (SEC_HOUR, break_level, cross_day_seconds, local_calendar, str2level_range, ts2datetime,
+                       ts2str_level, ts_cross_day)
+
+# local days of daylight saving transitions in US/Eastern, 23 and 25 hours long
+SPRING_FORWARD = '20150308'
+FALL_BACK = '20151101'
+
+
+def around(day_string, hours=30):
+    """Timestamps every 20 minutes from the local midnight of a day string, for `hours` hours."""
+    start = str2level_range(day_string, 0)[0]
+    return pd.Series(range(start - 2 * 3600, start + hours * 3600, 1200))
+
+
+class CalendarTest(unittest.TestCase):
+
+    def test_dst_days(self):
+        for day_string, hours in [(SPRING_FORWARD, 23), (FALL_BACK, 25), ('20150309', 24)]:
+            start, end = str2level_range(day_string, 0)
+            self.assertEqual(end - start, hours * SEC_HOUR)
+            self.assertEqual(ts2datetime(start).strftime('%Y%m%d %H:%M'), day_string + ' 00:00')
+
+    def test_bounds_are_arrow_midnights(self):
+        calendar = get_calendar(2015, 2015)
+        first = calendar.day_index(date(2015, 1, 1))
+        for ind in range(first, first + 366):
+            day = calendar.starts[0][ind]
+            midnight = arrow.get(day.strftime('%Y%m%d'), 'YYYYMMDD', tzinfo=calendar.tzinfo).timestamp
+            self.assertEqual(calendar.bounds[0][ind], midnight)
+        self.assertTrue(all(x.weekday() == 0 for x in calendar.starts[1]))
+        self.assertTrue(all(x.day == 1 for x in calendar.starts[2]))
+
+    def test_skipped_midnight(self):
+        # clocks in Sao Paulo went from 00:00 to 01:00 on 2015-10-18, the day starts at 01:00
+        calendar = Calendar(2015, 2015, 'America/Sao_Paulo')
+        midnight = calendar.bounds[0][calendar.day_index(date(2015, 10, 18))]
+        local = arrow.get(midnight).to('America/Sao_Paulo')
+        self.assertEqual((local.date(), local.hour), (date(2015, 10, 18), 1))
+        self.assertEqual(calendar.bounds[0][calendar.day_index(date(2015, 10, 19))] - midnight, 23 * SEC_HOUR)
+
+    def test_grows_to_years_asked(self):
+        calendar = get_calendar(2015, 2015)
+        self.assertIs(get_calendar(2015, 2015), calendar)
+        # extended to the years asked for, keeping the years it had
+        wider = get_calendar(1989, 1991)
+        self.assertTrue(wider.covers(1989, 1991) and wider.covers(2014, 2016))
+        start, end = str2level_range('1990W05', 1)
+        self.assertEqual(ts2datetime(start).strftime('%Y%m%d %H:%M'), '19900129 00:00')
+        self.assertEqual(end - start, 7 * 24 * SEC_HOUR)
+
+    def test_break_level_across_dst(self):
+        start, end = str2level_range('2015M03', 2)
+        days = break_level(start, end, 0)
+        self.assertEqual(len(days), (end - start + SEC_HOUR) // (24 * SEC_HOUR) - 1)
+        self.assertTrue(all(ts2datetime(x).strftime('%H:%M') == '00:00' for x in days))
+
+
+class SplitTest(unittest.TestCase):
+
+    def frame(self, rows):
+        return pd.DataFrame([{'from': lo, 'to': hi, 'delta': hi - lo, 'type': name} for lo, hi, name in rows],
+                            columns=['from', 'to', 'delta', 'type'])
+
+    def test_across_midnight(self):
+        start, end = str2level_range(FALL_BACK, 0)
+        data = self.frame([(start - 3600, start + 1800, 'Sleep'), (start + 7200, end + 600, 'Code'),
+                           (start + 3600, start + 7200, 'Meal')])
+        result = split_at_points(data, [start, end])
+        self.assertEqual(result[['from', 'to', 'type']].values.tolist(),
+                         [[start - 3600, start, 'Sleep'], [start, start + 1800, 'Sleep'],
+                          [start + 7200, end, 'Code'], [end, end + 600, 'Code'], [start + 3600, start + 7200, 'Meal']])
+        self.assertEqual(result.delta.sum(), data.delta.sum())
+        # the 25 hour day holds all of its seconds
+        self.assertEqual(result[result['from'] == start + 7200].delta.iloc[0], 23 * SEC_HOUR)
+
+    def test_many_points(self):
+        start, end = str2level_range('2015M03', 2)
+        points = break_level(start, end, 0)
+        result = split_at_points(self.frame([(start + 600, end - 600, 'Trip')]), points)
+        self.assertEqual(len(result), len(points) + 1)
+        self.assertEqual(result['from'].tolist()[1:], points)
+        self.assertEqual(result.delta.sum(), end - start - 1200)
+
+    def test_ends_on_point(self):
+        start, end = str2level_range(SPRING_FORWARD, 0)
+        data = self.frame([(start, end, 'Day'), (end, end + 60, 'Next')])
+        result = split_at_points(data, [start, end])
+        self.assertEqual(result[['from', 'to']].values.tolist(), [[start, end], [end, end + 60]])
+
+    def test_nothing_to_split(self):
+        data = self.frame([(0, 60, 'Code')])
+        self.assertTrue(split_at_points(data, []).equals(data))
+        self.assertEqual(split_at_points(data.iloc[:0], [30]).shape[0], 0)
+
+
+class LocalCalendarTest(unittest.TestCase):
+
+    def test_same_as_arrow(self):
+        for day_string in [SPRING_FORWARD, FALL_BACK, '20151231']:
+            timestamps = around(day_string)
+            result = local_calendar(timestamps)
+            for ind, timestamp in timestamps.iteritems():
+                local = ts2datetime(timestamp)
+                row = result.loc[ind]
+                self.assertEqual(row['date'], local.date())
+                self.assertEqual(row['hour'], local.hour)
+                for level, key in [(0, 'day_key'), (1, 'week_key'), (2, 'month_key')]:
+                    self.assertEqual(row[key], ts2str_level(timestamp, level))
+
+    def test_cross_day_seconds(self):
+        for day_string in [SPRING_FORWARD, FALL_BACK]:
+            timestamps = around(day_string)
+            self.assertEqual(cross_day_seconds(timestamps).tolist(), [ts_cross_day(x) for x in timestamps])
+
+
+if __name__ == '__main__':
+    unittest.main()
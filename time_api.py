@@ -1,61 +1,280 @@
 """This module connect aTimeLogger API."""
 import requests
 import json
+import os
 import arrow
+from collections import deque
 from datetime import datetime
+from multiprocessing.pool import ThreadPool
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+from requests.packages.urllib3.util.retry import Retry
+from time_calendar import TZINFO
 
-INTERVAL_MAX = 100000
+# point at a local fake server to test without aTimeLogger
+API_URL = "https://app.atimelogger.com/api/v2"
+PAGE_SIZE = 1000
 DAYS_NEW = 2
+FETCH_WORKERS = 4
+# retry 5xx responses and timeouts, sleeping BACKOFF * 2 ** n seconds between attempts
+RETRIES = 5
+BACKOFF = 0.5
+TIMEOUT = 30
+# ETag / Last-Modified of conditional requests, kept between runs
+VALIDATORS_FILE = 'api_cache.json'
+_AUTH = {}
+_CLIENT = {}
 
 
 def get_auth_header():
     """
-    Generate basic auth header for aTimeLogger.
+    Generate basic auth header for aTimeLogger. Credentials file is only read once per process.
     See the post for more info about the API, http://blog.timetrack.io/rest-api/
     """
+    if 'header' not in _AUTH:
+        # get username and password from text file
+        lines = [line.rstrip('\n') for line in open('pass.txt')]
+        username, password, dev_token = lines
+        _AUTH['header'] = HTTPBasicAuth(username, password)
+    return _AUTH['header']
 
-    # get username and password from text file
-    lines = [line.rstrip('\n') for line in open('pass.txt')]
-    username, password, dev_token = lines
-    return HTTPBasicAuth(username, password)
 
+class TimeLoggerClient(object):
+    """
+    Client for aTimeLogger API. All requests share one keep-alive session,
+    failed requests (5xx, timeouts, connection errors) are retried with exponential backoff.
+    """
+
+    def __init__(self, auth_header=None, pool_size=FETCH_WORKERS, validators_file=VALIDATORS_FILE):
+        """
+        :param auth_header: auth header for request data, default from get_auth_header().
+        :param pool_size: (int) number of connections kept alive, at least the number of concurrent requests.
+        :param validators_file: (str) json file to keep validators of conditional requests, None to not keep.
+        """
+        self.session = requests.Session()
+        self.session.auth = auth_header if auth_header is not None else get_auth_header()
+        retry = Retry(total=RETRIES, backoff_factor=BACKOFF, status_forcelist=(500, 502, 503, 504))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.validators_file = validators_file
+        self.validators = {}
+        # validators of responses the caller has not stored yet, see commit_validators()
+        self.pending = {}
+        if validators_file and os.path.exists(validators_file):
+            with open(validators_file) as f:
+                self.validators = json.load(f)
+
+    def get(self, path, params=None, conditional=False):
+        """
+        Request an API endpoint.
+        :param path: (str) endpoint path, e.g. '/types'.
+        :param params: (dict) query parameters.
+        :param conditional: (bool) send validators of the last committed response, so unchanged data is not sent
+            again. Validators of this response are only kept after commit_validators().
+        :return: (dict) parsed json, None when conditional and data has not been modified.
+        """
+        headers = {}
+        key = path + json.dumps(params, sort_keys=True)
+        if conditional and key in self.validators:
+            validator = self.validators[key]
+            if validator.get('etag'):
+                headers['If-None-Match'] = validator['etag']
+            if validator.get('modified'):
+                headers['If-Modified-Since'] = validator['modified']
+        response = self.session.get(API_URL + path, params=params, headers=headers, timeout=TIMEOUT)
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        if conditional:
+            self.hold_validator(key, response)
+        return response.json()
+
+    def hold_validator(self, key, response):
+        """
+        Hold ETag and Last-Modified of a response until its data is stored, see commit_validators().
+        :param key: (str) request key from path and params.
+        :param response: requests response.
+        """
+        etag, modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+        if etag or modified:
+            self.pending[key] = {'etag': etag, 'modified': modified}
+
+    def commit_validators(self):
+        """
+        Keep validators of held responses for the next conditional requests, call it once their data is committed.
+        Otherwise a failed write would be followed by 304 responses, and the changed data never written.
+        """
+        if not self.pending:
+            return
+        self.validators.update(self.pending)
+        self.pending = {}
+        if self.validators_file:
+            with open(self.validators_file, 'w') as f:
+                json.dump(self.validators, f)
+
+
+def get_client():
+    """Return the client shared by the whole process, created on first use."""
+    if 'client' not in _CLIENT:
+        _CLIENT['client'] = TimeLoggerClient()
+    return _CLIENT['client']
 
-def get_types(auth_header):
+
+def get_types(client, conditional=False):
     """
     Retrieve types data from aTimeLogger.
-    :param auth_header: auth header for request data.
-    :return: A list of dict for types data.
+    :param client: TimeLoggerClient for request data.
+    :param conditional: (bool) only retrieve types if they have changed since last conditional request,
+        call client.commit_validators() once they are stored.
+    :return: A list of dict for types data, None when conditional and types have not changed.
     """
-    r_type = requests.get("https://app.atimelogger.com/api/v2/types",
-                          auth=auth_header)
-    types = json.loads(r_type.text)
+    types = client.get("/types", conditional=conditional)
+    if types is None:
+        return None
     return types['types']
 
 
-def get_all_intervals(auth_header):
+def iter_interval_pages(client, offset=0, page_size=PAGE_SIZE):
+    """
+    Walk all intervals in aTimeLogger page by page, oldest first.
+    Only one page is held in memory, so each page can be written to database before the next is requested.
+    :param client: TimeLoggerClient for request data.
+    :param offset: (int) number of intervals to skip, resume point of an interrupted walk.
+    :param page_size: (int) number of intervals per request.
+    :return: generator of (offset, intervals), offset of the first interval in the page and a list of dict.
+    """
+    while True:
+        page = client.get("/intervals", params={'limit': page_size, 'offset': offset, 'order': 'asc'})
+        page = page['intervals']
+        if page:
+            yield offset, page
+        if len(page) < page_size:
+            break
+        offset += len(page)
+
+
+def get_all_intervals(client):
     """
-    Retrieve all intervals data from aTimeLogger. Number of entries is limited by INTERVAL_MAX.
-    :param auth_header: auth header for request data.
+    Retrieve all intervals data from aTimeLogger.
+    Prefer iter_interval_pages() for the whole history, this list holds every interval in memory.
+    :param client: TimeLoggerClient for request data.
     :return: A list of dict for intervals data.
     """
-    r_interval = requests.get("https://app.atimelogger.com/api/v2/intervals",
-                              params={'limit': INTERVAL_MAX, 'order': 'asc'},
-                              auth=auth_header)
-    intervals = json.loads(r_interval.text)
-    return intervals['intervals']
+    intervals = []
+    for offset, page in iter_interval_pages(client):
+        intervals.extend(page)
+    return intervals
 
 
-def get_new_intervals(auth_header):
+def get_new_intervals(client, start=None, end=None):
     """
-    Retrieve new intervals data from aTimeLogger. New intervals is defined by DAYS_NEW.
-    :param auth_header: auth header for request data.
+    Retrieve new intervals data from aTimeLogger between start and end.
+    The DAYS_NEW days before start are retrieved again, to catch intervals still running at last sync
+    and those logged or edited later with a start before it. Insertion by guid makes the overlap harmless.
+    Without start, new intervals are those in the last DAYS_NEW days.
+    :param client: TimeLoggerClient for request data.
+    :param start: (int) unix timestamp, usually the watermark of last sync.
+    :param end: (int) unix timestamp, default now.
     :return: A list of dict for intervals data.
     """
-    now = arrow.get(datetime.now(), 'US/Eastern')
-    start = now.replace(days=-DAYS_NEW).floor('day')
-    r_interval = requests.get("https://app.atimelogger.com/api/v2/intervals",
-                              params={'from': str(start.timestamp), 'to': str(now.timestamp)},
-                              auth=auth_header)
-    intervals = json.loads(r_interval.text)
-    return intervals['intervals']
+    now = arrow.get(datetime.now(), TZINFO)
+    if end is None:
+        end = now.timestamp
+    since = now if start is None else arrow.get(start).to(TZINFO)
+    start = since.replace(days=-DAYS_NEW).floor('day').timestamp
+    return get_intervals_window(client, start, end)
+
+
+def get_intervals_window(client, start, end, page_size=PAGE_SIZE):
+    """
+    Retrieve all intervals between start and end, page by page.
+    :param client: TimeLoggerClient for request data.
+    :param start: (int) unix timestamp.
+    :param end: (int) unix timestamp.
+    :param page_size: (int) number of intervals per request.
+    :return: A list of dict for intervals data, oldest first.
+    """
+    intervals = []
+    while True:
+        page = client.get("/intervals", params={'from': str(start), 'to': str(end), 'order': 'asc',
+                                                'limit': page_size, 'offset': len(intervals)})
+        page = page['intervals']
+        intervals.extend(page)
+        if len(page) < page_size:
+            return intervals
+
+
+def get_first_timestamp(client):
+    """
+    Find when the history in aTimeLogger begins.
+    :param client: TimeLoggerClient for request data.
+    :return: (int) unix timestamp of the oldest interval, None for an empty history.
+    """
+    intervals = client.get("/intervals", params={'limit': 1, 'order': 'asc'})['intervals']
+    return intervals[0]['from'] if intervals else None
+
+
+def history_windows(start, end, unit='month', tzinfo=TZINFO):
+    """
+    Split a time range into calendar windows.
+    :param start: (int) unix timestamp.
+    :param end: (int) unix timestamp.
+    :param unit: (str) window length, 'day', 'week', 'month' or 'year'.
+    :param tzinfo: A string for timezone, default is TZINFO.
+    :return: (list) tuples of (start, end) unix timestamps, first and last windows clipped to the range.
+    """
+    spans = arrow.Arrow.span_range(unit, arrow.get(start).to(tzinfo), arrow.get(end - 1).to(tzinfo))
+    windows = [(max(s.timestamp, start), min(e.timestamp + 1, end)) for s, e in spans]
+    return windows
+
+
+def fetch_history(client, start=None, end=None, unit='month', workers=FETCH_WORKERS):
+    """
+    Download types and intervals concurrently, intervals split in calendar windows.
+    At most 2 * workers windows are in flight or waiting, so memory does not grow with history length.
+    Windows are yielded in time order, an interval crossing a window edge is only yielded once.
+    :param client: TimeLoggerClient for request data.
+    :param start: (int) unix timestamp, default the beginning of history.
+    :param end: (int) unix timestamp, default now.
+    :param unit: (str) window length, see history_windows().
+    :param workers: (int) number of concurrent requests.
+    :return: (types, windows), a list of dict for types data and a generator of (start, end, intervals).
+    """
+    pool = ThreadPool(workers)
+    types_job = pool.apply_async(get_types, (client,))
+    if start is None:
+        start = get_first_timestamp(client)
+    if end is None:
+        end = arrow.utcnow().timestamp
+    windows = history_windows(start, end, unit) if start is not None else []
+    pending = deque()
+    windows = iter(windows)
+    for window in windows:
+        pending.append((window, pool.apply_async(get_intervals_window, (client,) + window)))
+        if len(pending) >= 2 * workers:
+            break
+
+    def merge():
+        last_guids = set()
+        try:
+            while pending:
+                window, job = pending.popleft()
+                intervals = job.get()
+                for next_window in windows:
+                    pending.append((next_window, pool.apply_async(get_intervals_window,
+                                                                  (client,) + next_window)))
+                    break
+                guids = set(x['guid'] for x in intervals)
+                intervals = [x for x in intervals if x['guid'] not in last_guids]
+                last_guids = guids
+                yield window[0], window[1], intervals
+        finally:
+            pool.terminate()
+
+    try:
+        types = types_job.get()
+    except Exception:
+        pool.terminate()
+        raise
+    return types, merge()
@@ -0,0 +1,121 @@
+"""This module defines the calendar dimension, local period boundaries precomputed as sorted arrays.
+It needs no pandas, so database code can use it without loading the analysis stack.
+"""
+from calendar import timegm
+import numpy as np
+from datetime import date
+from datetime import datetime
+from datetime import timedelta
+from dateutil import tz
+
+TZINFO = 'US/Eastern'
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# Calendar of each timezone, grown to cover every year asked for, see get_calendar()
+_CALENDAR = {}
+
+
+class Calendar(object):
+    """
+    Calendar dimension: local day, week (from Monday) and month boundaries of whole years in a timezone,
+    as sorted arrays of unix timestamps, so finding boundaries is an array slice or np.searchsorted().
+    Boundaries are local midnights from the timezone data of dateutil (same as Arrow),
+    so days around DST are 23 or 25 hours long.
+    """
+
+    def __init__(self, first_year, last_year, tzinfo=TZINFO):
+        """
+        :param first_year: (int) first year covered.
+        :param last_year: (int) last year covered.
+        :param tzinfo: A string for timezone, default is TZINFO.
+        """
+        self.first_year, self.last_year, self.tzinfo = first_year, last_year, tzinfo
+        zone = tz.gettz(tzinfo)
+        first = date(first_year, 1, 1)
+        # one more midnight at the end, the end of last day
+        days = [first + timedelta(days=x) for x in range((date(last_year + 1, 1, 1) - first).days + 1)]
+        local = [datetime(x.year, x.month, x.day, tzinfo=zone) for x in days]
+        offsets = [int(x.utcoffset().total_seconds()) for x in local]
+        midnights = [(x.toordinal() - EPOCH_ORDINAL) * 86400 - offset for x, offset in zip(days, offsets)]
+        for ind in range(1, len(days)):
+            # a midnight skipped by DST (in some timezones) is moved forward to the end of the gap
+            if offsets[ind] != offsets[ind - 1] and not tz.datetime_exists(local[ind]):
+                midnights[ind] = timegm(tz.resolve_imaginary(local[ind]).utctimetuple())
+        days, midnights = np.array(days, dtype=object), np.array(midnights, dtype=np.int64)
+        is_monday = np.array([x.weekday() == 0 for x in days])
+        is_first = np.array([x.day == 1 for x in days])
+        # level: sorted unix timestamps of period starts, local midnights
+        self.bounds = {0: midnights, 1: midnights[is_monday], 2: midnights[is_first]}
+        # level: local date (datetime.date) of period starts
+        self.starts = {0: days, 1: days[is_monday], 2: days[is_first]}
+
+    def covers(self, first_year, last_year):
+        """Tell if given years are all in the calendar, with a year to spare each side."""
+        return self.first_year < first_year and last_year < self.last_year
+
+    def day_index(self, day):
+        """
+        Position of a local date in day boundaries.
+        :param day: datetime.date
+        :return: (int)
+        """
+        return (day - self.starts[0][0]).days
+
+    def floor_index(self, timestamps, level):
+        """
+        Position of the period each timestamp falls in.
+        :param timestamps: (int or array) unix timestamps.
+        :param level: (int) time frame number.
+        :return: (int or array)
+        """
+        return np.searchsorted(self.bounds[level], timestamps, side='right') - 1
+
+    def floor(self, timestamp, level):
+        """Return (int) unix timestamp of the start of the period a timestamp falls in."""
+        return int(self.bounds[level][self.floor_index(timestamp, level)])
+
+    def next_bound(self, timestamp, level):
+        """Return (int) unix timestamp of the first period start after a timestamp."""
+        return int(self.bounds[level][self.floor_index(timestamp, level) + 1])
+
+    def between(self, start, end, level):
+        """
+        Period starts strictly between start and end.
+        :param start: (int) unix timestamp.
+        :param end: (int) unix timestamp.
+        :param level: (int) time frame number.
+        :return: (list) unix timestamps.
+        """
+        bounds = self.bounds[level]
+        first = np.searchsorted(bounds, start, side='right')
+        last = np.searchsorted(bounds, end, side='left')
+        return bounds[first:last].tolist()
+
+
+def get_calendar(first_year, last_year, tzinfo=TZINFO):
+    """
+    Return the Calendar of a timezone covering given years, built once and extended when a later call
+    asks for years outside of it.
+    :param first_year: (int) first year needed.
+    :param last_year: (int) last year needed.
+    :param tzinfo: A string for timezone, default is TZINFO.
+    :return: Calendar
+    """
+    calendar = _CALENDAR.get(tzinfo)
+    if calendar is None or not calendar.covers(first_year, last_year):
+        if calendar is not None:
+            first_year, last_year = min(first_year, calendar.first_year), max(last_year, calendar.last_year)
+        # a year more each side, so periods around the edges can always be looked up
+        calendar = Calendar(first_year - 1, last_year + 1, tzinfo)
+        _CALENDAR[tzinfo] = calendar
+    return calendar
+
+
+def calendar_between(start, end, tzinfo=TZINFO):
+    """
+    Return the Calendar covering a time range.
+    :param start: (int) unix timestamp.
+    :param end: (int) unix timestamp.
+    :param tzinfo: A string for timezone, default is TZINFO.
+    :return: Calendar
+    """
+    return get_calendar(datetime.utcfromtimestamp(start).year, datetime.utcfromtimestamp(end).year, tzinfo)
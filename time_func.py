@@ -1,13 +1,18 @@
 """This module defines helper functions to get/transform datetime object."""
 import arrow
+import numpy as np
+import pandas as pd
+from datetime import date
 from datetime import datetime
 from datetime import timedelta
+from time_calendar import TZINFO, Calendar, get_calendar, calendar_between
 
 SEC_HOUR = 60 * 60.
 SEC_DAY = SEC_HOUR * 24
 STR2LEVEL = {"days": 0, "weeks": 1, "months": 2}
 LEVEL2STR = {0: "days", 1: "weeks", 2: "months"}
-# TODO Build TZINFO global parameter
+# column of local_calendar() holding the date string of each time level, same as ts2str_level()
+LEVEL2KEY = {0: "day_key", 1: "week_key", 2: "month_key"}
 
 def fmt_cal_str(cal_string):
     """
@@ -33,7 +38,7 @@ def quick_range(current=True, shift=0, unit='days'):
     :param unit: days/weeks/months/years
     :return: (int) start, (int) end
     """
-    now = arrow.get(datetime.now(), 'US/Eastern')
+    now = arrow.get(datetime.now(), TZINFO)
     current = 0 if current else 1
     # build arguments for arrow.replace()
     end_arg = {unit: current*(-1)}
@@ -60,7 +65,7 @@ def human_qr(phrase):
     return start, end
 
 
-def str2datetime(date_string, tzinfo='US/Eastern'):
+def str2datetime(date_string, tzinfo=TZINFO):
     """
     Transform a date string into Arrow datetime object.
     :param date_string: A string of date (e.g. "20150112").
@@ -71,7 +76,7 @@ def str2datetime(date_string, tzinfo='US/Eastern'):
     return date_time
 
 
-def str2ts(date_string, tzinfo='US/Eastern'):
+def str2ts(date_string, tzinfo=TZINFO):
     """
     Transform a date string into unix timestamp (beginning of the date).
     :param date_string: a date string in form of "YYYYMMDD".
@@ -82,7 +87,7 @@ def str2ts(date_string, tzinfo='US/Eastern'):
     return timestamp
 
 
-def str2range(date_string1, date_string2, tzinfo='US/Eastern'):
+def str2range(date_string1, date_string2, tzinfo=TZINFO):
     """
     Get unix timestamps for two date string as a range, not including the second date.
     :param date_string1: a date string in form of "YYYYMMDD".
@@ -95,7 +100,7 @@ def str2range(date_string1, date_string2, tzinfo='US/Eastern'):
     return start, end
 
 
-def str2level_range(date_string, level, tzinfo='US/Eastern'):
+def str2level_range(date_string, level, tzinfo=TZINFO):
     """
     Get start and end unix timestamps for given date string.
         Day: "YYYYMMDD", e.g. "20151225"
@@ -106,29 +111,59 @@ def str2level_range(date_string, level, tzinfo='US/Eastern'):
     :param tzinfo: A string for timezone, default is 'US/Eastern'.
     :return: (int) start, (int) end
     """
-    start = None
-    unit = LEVEL2STR[level]
-    replace_arg = {unit: 1}
     if level == 0:
-        start = str2ts(date_string, tzinfo=tzinfo)
+        day = datetime.strptime(date_string, '%Y%m%d').date()
+        calendar = get_calendar(day.year, day.year + 1, tzinfo)
+        ind = calendar.day_index(day)
+        return int(calendar.bounds[0][ind]), int(calendar.bounds[0][ind + 1])
     elif level == 1:
         start = parse_week_number(date_string, tzinfo).timestamp
+        calendar = get_calendar(int(date_string[:4]), int(date_string[:4]) + 1, tzinfo)
+        return start, calendar.next_bound(start, 1)
     elif level == 2:
         return week_of_month(date_string, tzinfo)
-    end = ts2datetime(start, tzinfo=tzinfo).replace(**replace_arg).timestamp
-    return start, end
 
 
-def week_of_month(month_str, tzinfo='US/Eastern'):
-    year, month = month_str.split('M')
+def level_keys(first, last, level):
+    """
+    List date strings of every time frame from first to last, both included.
+    Strings are in the formats of str2level_range(), weeks are ISO weeks.
+    :param first: a date string of the first time frame, e.g. "2015W50".
+    :param last: a date string of the last time frame, e.g. "2016W03".
+    :param level: An integer for different time levels.
+    :return: (list) date strings.
+    """
+    keys = []
+    if level == 0:
+        day, last_day = [datetime.strptime(x, '%Y%m%d').date() for x in (first, last)]
+        while day <= last_day:
+            keys.append(day.strftime('%Y%m%d'))
+            day += timedelta(days=1)
+    elif level == 1:
+        monday, last_monday = [parse_week_number(x).date() for x in (first, last)]
+        while monday <= last_monday:
+            keys.append('{0}W{1:02d}'.format(*monday.isocalendar()[:2]))
+            monday += timedelta(weeks=1)
+    elif level == 2:
+        (year, month), last_month = [tuple(int(y) for y in x.split('M')) for x in (first, last)]
+        while (year, month) <= last_month:
+            keys.append('{0}M{1:02d}'.format(year, month))
+            year, month = year + month // 12, month % 12 + 1
+    return keys
+
+
+def week_of_month(month_str, tzinfo=TZINFO):
+    year, month = [int(x) for x in month_str.split('M')]
+    calendar = get_calendar(year, year + 1, tzinfo)
     # every 4th of that month will in the first week for that month
-    month_4th = arrow.get(year+month+"04", "YYYYMMDD", tzinfo=tzinfo)
-    week_start = month_4th.floor('week').timestamp
-    week_end = month_4th.replace(months=+1).replace(weeks=-1).ceil('week').timestamp+1
+    month_4th = calendar.bounds[0][calendar.day_index(date(year, month, 4))]
+    next_4th = calendar.bounds[0][calendar.day_index(date(year + month // 12, month % 12 + 1, 4))]
+    week_start = calendar.floor(month_4th, 1)
+    week_end = calendar.floor(next_4th, 1)
     return week_start, week_end
 
 
-def ts2datetime(timestamp, tzinfo='US/Eastern'):
+def ts2datetime(timestamp, tzinfo=TZINFO):
     """
     Get Arrow datetime object from unix timestamp
     :param timestamp: A integer of unix timestamp.
@@ -138,7 +173,7 @@ def ts2datetime(timestamp, tzinfo='US/Eastern'):
     return arrow.get(timestamp).to(tzinfo)
 
 
-def ts2date(timestamp, tzinfo='US/Eastern'):
+def ts2date(timestamp, tzinfo=TZINFO):
     """
     Get Arrow date object from unix timestamp
     :param timestamp: A integer of unix timestamp.
@@ -148,7 +183,7 @@ def ts2date(timestamp, tzinfo='US/Eastern'):
     return ts2datetime(timestamp, tzinfo).date()
 
 
-def ts2str_level(timestamp, level, tzinfo='US/Eastern'):
+def ts2str_level(timestamp, level, tzinfo=TZINFO):
     """
     Transform unix timestamp into date string.
     :param level: (int) time frame number
@@ -167,7 +202,46 @@ def ts2str_level(timestamp, level, tzinfo='US/Eastern'):
     return date_string
 
 
-def ts2str_hm(timestamp, tzinfo='US/Eastern'):
+def local_calendar(timestamps, tzinfo=TZINFO):
+    """
+    Vectorized version of ts2datetime(), ts2date() and ts2str_level() for a whole column.
+    Timezone is resolved once for all rows instead of building an Arrow object per row.
+    :param timestamps: (Series) unix timestamps.
+    :param tzinfo: A string for timezone, default is TZINFO.
+    :return: (DataFrame) same index as timestamps, columns:
+        datetime (local datetime), day (local midnight, timezone naive), date (datetime.date), hour,
+        day_key ("YYYYMMDD"), week_key ("YYYYWww"), month_key ("YYYYMmm").
+    """
+    local = pd.to_datetime(timestamps, unit='s', utc=True).dt.tz_convert(tzinfo)
+    day = local.dt.tz_localize(None).dt.normalize()
+    year = local.dt.year.astype(str)
+    month = local.dt.month.astype(str).str.zfill(2)
+    calendar = pd.DataFrame({'datetime': local,
+                             'day': day,
+                             'date': day.dt.date,
+                             'hour': local.dt.hour,
+                             'day_key': year + month + local.dt.day.astype(str).str.zfill(2),
+                             'week_key': year + 'W' + local.dt.weekofyear.astype(str).str.zfill(2),
+                             'month_key': year + 'M' + month},
+                            index=timestamps.index)
+    return calendar
+
+
+def cross_day_seconds(timestamps, tzinfo=TZINFO):
+    """
+    Vectorized version of ts_cross_day() for a whole column.
+    :param timestamps: (Series) unix timestamps.
+    :param tzinfo: A string for timezone, default is TZINFO.
+    :return: (Series) time of day in seconds, times before 20:00 are moved to next day.
+    """
+    local = pd.to_datetime(timestamps, unit='s', utc=True).dt.tz_convert(tzinfo)
+    hour = local.dt.hour
+    seconds = hour * 3600 + local.dt.minute * 60 + local.dt.second
+    seconds += (hour < 20) * 24 * 3600
+    return seconds
+
+
+def ts2str_hm(timestamp, tzinfo=TZINFO):
     """
     Transform unix timestamp into string of hour and minute at the time.
     :param timestamp: A integer of unix timestamp.
@@ -202,7 +276,7 @@ def sec2str(duration, sign=False):
     return time_str
 
 
-def ts_cross_day(timestamp, tzinfo='US/Eastern'):
+def ts_cross_day(timestamp, tzinfo=TZINFO):
     """
     Make timestamps in the last night and next day before dawn comparable for sleep analysis.
         Transform a time before 20:00 into next day in seconds, and after 20:00 into one day in seconds.
@@ -229,10 +303,10 @@ def get_datelist(start, end, level):
     :param level: An integer for different time levels.
     :return: a list of datetime object.
     """
-    start, end = ts2datetime(start), ts2datetime(end - 1)
-    unit = LEVEL2STR[level][:-1]
-    result = [s.date() for s, e in arrow.Arrow.span_range(unit, start, end)]
-    return result
+    calendar = calendar_between(start, end)
+    first = calendar.floor_index(start, level)
+    last = calendar.floor_index(end - 1, level)
+    return list(calendar.starts[level][first:last + 1])
 
 
 def day_info(date_string=None):
@@ -263,7 +337,7 @@ def day_info(date_string=None):
     return strings
 
 
-def parse_week_number(week_str, tzinfo='US/Eastern'):
+def parse_week_number(week_str, tzinfo=TZINFO):
     """
     Parse week number string into the monday of that week
     :param week_str: (string) describe weeks, e.g. "1991W05".
@@ -271,16 +345,17 @@ def parse_week_number(week_str, tzinfo='US/Eastern'):
     :return: datetime
     """
     try:
-        year, week = week_str.split('W')
+        year, week = [int(x) for x in week_str.split('W')]
+        calendar = get_calendar(year, year + 1, tzinfo)
         # every 4 Jan will in the first week (ISO)
-        week_01 = arrow.get(year+"0104", "YYYYMMDD", tzinfo=tzinfo).floor('week')
-        monday = week_01.replace(weeks=int(week)-1)
-        return monday
+        week_01 = calendar.floor_index(calendar.bounds[0][calendar.day_index(date(year, 1, 4))], 1)
+        monday = calendar.bounds[1][week_01 + week - 1]
+        return ts2datetime(int(monday), tzinfo)
     except ValueError:
         print "Please input week number in the form of '1990W05'."
 
 
-def break_level(start, end, level, tzinfo='US/Eastern'):
+def break_level(start, end, level, tzinfo=TZINFO):
     """
     Return a list of unix timestamp break the start and end time according to given time frame.
     start and end are not included.
@@ -290,31 +365,11 @@ def break_level(start, end, level, tzinfo='US/Eastern'):
     :param level: int of time frame
     :return: list of unix timestamp
     """
-    start_time = ts2datetime(start, tzinfo=tzinfo)
-    end_time = ts2datetime(end, tzinfo=tzinfo)
-    break_points = []
-    if level == 0:
-        break_points = arrow.Arrow.range('day', start_time, end_time)[1:-1]
-    else:
-        replace_arg = {LEVEL2STR[level]: 1}
-        if (level == 1 and start_time.isocalendar()[:2] == end_time.isocalendar()[:2]) or \
-                (level == 2 and start_time.strftime("%Y%m") == end_time.strftime("%Y%m")):
-            pass
-        else:
-            point = start_time
-            while True:
-                point = point.replace(**replace_arg).floor(LEVEL2STR[level][:-1])
-                if point >= end_time:
-                    break
-                break_points.append(point)
-    break_points = [x.timestamp for x in break_points]
-    return break_points
+    return calendar_between(start, end, tzinfo).between(start, end, level)
 
 
 def get_days_of_month(start, end):
     ts_list = [start] + break_level(start, end, 2) + [end]
-    date_list = map(lambda x: ts2date(x), ts_list)
-    days_list = []
-    for n in range(len(date_list)-1):
-        days_list.append((date_list[n+1]-date_list[n]).days)
-    return days_list
+    calendar = calendar_between(start, end)
+    days = calendar.floor_index(np.asarray(ts_list, dtype=np.int64), 0)
+    return np.diff(days).tolist()